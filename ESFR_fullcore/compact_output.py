@@ -0,0 +1,65 @@
+import tally_archive
+from statepoint_reader import requested_names
+
+"""
+Compact output profile of a run, for sweeps where only some tally means are plotted.
+
+By default every statepoint of a run holds the sum and sum of squares of every tally in
+float64 and the whole source bank, and OpenMC also writes all tallies as text to
+tallies.out. compact() sets a model up to write less:
+
+- only the selected tallies are written to the statepoints (Tally.writable), the others are
+  still tallied, e.g. for their triggers. A tally merged by tally_planner.py is written if
+  any of its requested names is selected;
+- statepoints only at the configured batches and the last one;
+- the source bank only with the final statepoint and only if asked for, e.g. for the warm
+  starts of warm_start.py. A triggered run writes its final statepoint at the batch its
+  targets are reached, so the source bank is enabled at every batch the triggers are checked
+  at; only statepoints are written with it, the intermediate ones on such a batch included;
+- no tallies.out.
+
+archive() then keeps the selected tallies of the final statepoint as float32 mean and
+relative error in a tally archive (tally_archive.py). tally_budget.py estimates the output
+of the profile like any other settings.
+"""
+
+def _last_batch(settings):
+    return settings.trigger_max_batches if settings.trigger_active else settings.batches
+
+def _final_batches(settings):
+    """the batches a run can end at: the last one or, if triggered, any batch the triggers are checked at"""
+    if not settings.trigger_active:
+        return [settings.batches]
+    interval = settings.trigger_batch_interval or 1
+    return sorted(set(range(settings.batches, settings.trigger_max_batches + 1, interval)) | {settings.trigger_max_batches})
+
+def compact(model, tallies=None, statepoint_batches=(), source=False):
+    """
+    Set model to the compact output: the statepoints only hold the tallies requested as a
+    name in tallies (all if None) and are only written at statepoint_batches and the last
+    batch, the source bank is only written with the final statepoint if source.
+
+    Call it after add_triggers() of main_esfr.py, the last batch of a triggered run is
+    trigger_max_batches.
+    """
+    if tallies is not None:
+        tallies = set(tallies)
+        unknown = tallies - {name for tally in model.tallies for name in requested_names(tally.name)}
+        if unknown:
+            raise ValueError('no tallies named {} in the model'.format(', '.join(repr(name) for name in sorted(unknown))))
+    for tally in model.tallies:
+        tally.writable = tallies is None or bool(tallies & set(requested_names(tally.name)))
+
+    settings = model.settings
+    last = _last_batch(settings)
+    batches = sorted(set(statepoint_batches) | {last})
+    if batches[0] < 1 or batches[-1] > last:
+        raise ValueError('statepoint batches must be between 1 and the last batch {}'.format(last))
+    settings.statepoint = {'batches': batches}
+    settings.sourcepoint = {'batches': _final_batches(settings), 'write': True} if source else {'write': False}
+    settings.output = dict(settings.output or {}, tallies=False)
+    return model
+
+def archive(statepoint, path, tallies=None, scores=None):
+    """float32 mean and relative error of the tallies written to statepoint (those named tallies if given) in the archive path"""
+    return tally_archive.export_archive(statepoint, path, names=tallies, scores=scores)
@@ -1,41 +1,98 @@
+import os
+
 import matplotlib.pyplot as plt 
-import openmc
-import openmc.deplete
 import numpy as np 
+import h5py
+
+def _read_results(path):
+    """time (d), keff, keff std and atoms[time, material, nuclide] of all materials and nuclides, in one pass"""
+    with h5py.File(path, 'r') as f:
+        time = f['time'][:, 0] / (24*60*60)  # convert back to days from seconds
+        k = f['eigenvalues'][:, 0]           # first stage of each step, as ResultsList.get_eigenvalue
+        number = f['number'][:, 0]           # atoms at the beginning of each step
+
+        materials = np.empty(len(f['materials']), dtype=object)
+        for mat, group in f['materials'].items():
+            materials[group.attrs['index']] = mat
+
+        nuclides = np.empty(number.shape[2], dtype=object)
+        for nuc, group in f['nuclides'].items():
+            if 'atom number index' in group.attrs:
+                nuclides[group.attrs['atom number index']] = nuc
+
+    return {'time': time, 'k': k[:, 0], 'k_std': k[:, 1], 'atoms': number,
+            'materials': materials.astype(str), 'nuclides': nuclides.astype(str)}
+
+def read_results(path="depletion_results.h5", sidecar=True):
+    """
+    all of depletion_results.h5 that is used here, see _read_results,
+    cached in a sidecar file next to it that is renewed when the results file changes
+    """
+    stat = os.stat(path)
+    sidecar_path = path + '.inventory.npz'
+
+    if sidecar and os.path.exists(sidecar_path):
+        with np.load(sidecar_path) as cached:
+            if cached['mtime'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+                return {key: cached[key] for key in cached.files if key not in ('mtime', 'size')}
+
+    results = _read_results(path)
+    if sidecar:
+        np.savez(sidecar_path, mtime=stat.st_mtime_ns, size=stat.st_size, **results)
+    return results
+
+def read_inventory(nuclides, materials=None, path="depletion_results.h5"):
+    """
+    time (d) and atoms[time, material, nuclide] for the nuclides and materials (ids, all if None)
+    asked for, from a single read of the results file
+    """
+    results = read_results(path)
+    mat_index = {mat: i for i, mat in enumerate(results['materials'])}
+    nuc_index = {nuc: i for i, nuc in enumerate(results['nuclides'])}
+
+    mats = [mat_index[str(mat)] for mat in (results['materials'] if materials is None else materials)]
+    nucs = [nuc_index[nuc] for nuc in nuclides]
+    return results['time'], results['atoms'][:, mats][:, :, nucs]
 
-"""Take a look at changes of keff over time"""
-results = openmc.deplete.ResultsList.from_hdf5("depletion_results.h5")
-# time, k = results.get_eigenvalue()
-# time /= (24*60*60)  # convert back to days from seconds
+def read_keff(path="depletion_results.h5"):
+    """time (d), keff and its std at every depletion step"""
+    results = read_results(path)
+    return results['time'], results['k'], results['k_std']
 
-# plt.errorbar(time, k[:, 0], yerr=k[:, 1], color='forestgreen', fmt='-o', linestyle='--', linewidth=2)
-# plt.xlabel("Time [d]")
-# plt.ylabel(r'$k_{eff}\pm \sigma$')
-# plt.ylim([0.998,1.01])
-# plt.title(r'Evolution of $k_{eff}$ during six months')
-# plt.grid()
-# plt.show()
+def conversion_ratio(materials=("18", "19"), path="depletion_results.h5"):
+    """time (d) and N_Pu239 / N_U235 summed over materials (inner and outer fuel)"""
+    t, atoms = read_inventory(["U235", "Pu239"], materials, path)
+    U5_tot, Pu9_tot = atoms.sum(axis=1).T
+    return t, Pu9_tot/U5_tot
 
+def plot_keff(path="depletion_results.h5"):
+    """Take a look at changes of keff over time"""
+    time, k, k_std = read_keff(path)
 
-"""Take a look at conversion ratio of 235U vs 239Pu"""
-t, U5_i = results.get_atoms(mat = "18",nuc = "U235")
-t, Pu9_i = results.get_atoms(mat = "18",nuc = "Pu239")
+    plt.errorbar(time, k, yerr=k_std, color='forestgreen', fmt='-o', linestyle='--', linewidth=2)
+    plt.xlabel("Time [d]")
+    plt.ylabel(r'$k_{eff}\pm \sigma$')
+    plt.ylim([0.998,1.01])
+    plt.title(r'Evolution of $k_{eff}$ during six months')
+    plt.grid()
+    plt.show()
 
-t, U5_o = results.get_atoms(mat = "19",nuc = "U235")
-t, Pu9_o = results.get_atoms(mat = "19",nuc = "Pu239")
+def plot_conversion_ratio(path="depletion_results.h5"):
+    """Take a look at conversion ratio of 235U vs 239Pu"""
+    t, con_ratio = conversion_ratio(path=path)
 
-U5_tot = U5_i + U5_o
-Pu9_tot = Pu9_i + Pu9_o
+    #t, atoms = read_inventory(["U235", "Pu239"], ("18", "19"), path)
+    #plt.plot(t, atoms[:, :, 1].sum(axis=1), label = "239Pu")
+    #plt.plot(t, atoms[:, :, 0].sum(axis=1), label = "235U")
 
-con_ratio = Pu9_tot/U5_tot
-t /= (24*60*60)
+    plt.plot(t, con_ratio, color='forestgreen', linewidth=2.5, linestyle='--',)
+    plt.xlabel("Time [d]")
+    plt.ylabel(r'$\frac{N_{239Pu}}{N_{235U}}$');
+    plt.title("Conversion ratio of 239Pu vs 235U")
+    plt.grid()
+    plt.show()
 
-#plt.plot(t, Pu9_tot, label = "239Pu")
-#plt.plot(t, U5_tot, label = "235U")
 
-plt.plot(t, con_ratio, color='forestgreen', linewidth=2.5, linestyle='--',)
-plt.xlabel("Time [d]")
-plt.ylabel(r'$\frac{N_{239Pu}}{N_{235U}}$');
-plt.title("Conversion ratio of 239Pu vs 235U")
-plt.grid()
-plt.show()
\ No newline at end of file
+if __name__ == '__main__':
+    # plot_keff()
+    plot_conversion_ratio()
@@ -0,0 +1,105 @@
+import os
+import time
+
+import h5py
+
+"""
+Checkpointed depletion of the ESFR.
+
+The six 30-day steps at 3600 MWth are integrated one step at a time, each step restarting
+from the end of the previous one in directory/depletion_results.h5 (OpenMC reuses the reaction
+rates of the final transport solve of the previous step, so no transport solve is done
+twice). If a job dies or runs out of time, running deplete() again continues from the
+last completed step, so a long burnup campaign can be split over several job windows.
+"""
+
+# ENDF/B-VII.1 Chain (Fast Spectrum)
+chain_path = '/Volumes/T7/nndc/chain_endfb71_sfr.xml'
+
+#power = 1200e6 # W
+
+# ESFR made to be 3600 MWth
+power = 3600e6 # W
+
+# six months with time step of a month
+time_steps = [30*24*60*60] * 6
+
+def completed_steps(results='depletion_results.h5'):
+    """
+    number of completed depletion steps in results.
+
+    A completed step ends with an end of step entry (time [t, t]). If a job died during the
+    final transport solve of a step, the last entry is the beginning of that step
+    (time [t, t + dt]), with the same concentrations and reaction rates as the end of the
+    step before, so it is turned back into that checkpoint.
+    """
+    if not os.path.exists(results):
+        return 0
+
+    with h5py.File(results, 'r+') as f:
+        t = f['time']
+        if t[-1, 0] != t[-1, 1]:
+            print('depletion: last step in {} was not completed, resuming from t = {:.1f} d'.format(
+                  results, t[-1, 0] / (24*60*60)))
+            t[-1] = [t[-1, 0], t[-1, 0]]
+        return len(t) - 1
+
+def deplete(time_steps=time_steps, power=power, chain=chain_path, directory='.',
+            max_steps=None, walltime=None, **model_args):
+    """
+    Integrate the time_steps (s) not yet in directory/depletion_results.h5 with the
+    PredictorIntegrator, one step at a time.
+
+    Stops after max_steps steps, or before a step that would probably not finish within
+    walltime (s) from now, judged by the longest step so far. Returns the number of
+    completed steps.
+    """
+    import openmc.deplete
+    from main_esfr import build_model
+    from structure_esfr import fuels, default_params
+
+    start = time.time()
+    step_times = []
+
+    os.makedirs(directory, exist_ok=True)
+    results = os.path.join(directory, 'depletion_results.h5')
+    chain = os.path.abspath(chain)
+
+    n_done = completed_steps(results)
+    for i in range(n_done, len(time_steps)):
+        if max_steps is not None and i - n_done >= max_steps:
+            break
+        if walltime is not None and step_times and time.time() - start + max(step_times) > walltime:
+            print('depletion: stopping before step {} to stay within the walltime'.format(i + 1))
+            break
+
+        step_start = time.time()
+
+        # the fuels of the params the model is built for, custom fuel vectors included
+        model = build_model(**model_args)
+        for fuel in fuels(model_args.get('params') or default_params):
+            fuel.depletable = True
+
+        prev_results = openmc.deplete.Results(results) if i > 0 else None
+
+        # the integrator writes depletion_results.h5 in the working directory
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            operator = openmc.deplete.CoupledOperator(model, chain, prev_results=prev_results)
+
+            # final_step=True gives the transport solve at the end of the step, which is the
+            # start of the next step when it is restarted from the results
+            integrator = openmc.deplete.PredictorIntegrator(operator, [time_steps[i]], power, timestep_units='s')
+            integrator.integrate(final_step=True)
+        finally:
+            os.chdir(cwd)
+
+        step_times.append(time.time() - step_start)
+        print('depletion: step {}/{} done in {:.0f} s'.format(i + 1, len(time_steps), step_times[-1]))
+
+    return completed_steps(results)
+
+
+if __name__ == '__main__':
+    deplete()
@@ -0,0 +1,201 @@
+import numpy as np
+
+from structure_esfr import build_core, default_params, ring_positions
+
+"""
+Two-group hex-nodal diffusion estimate of the ESFR power shape.
+
+One node per hexagonal assembly of core_uni_grid and axial layer (lower axial reflector,
+fuel height, upper axial reflector), with finite difference coupling between neighbouring
+nodes and Marshak vacuum conditions at the edge of the core lattice and at the ends of the
+axial reflectors. The eigenvalue problem is solved by power iterations with Jacobi inner
+iterations, vectorized over all nodes with NumPy.
+
+The group constants below are rough homogenized values for the assembly types (fast group
+above ~100 keV). They are only meant to give the shape of the power, which is used as
+initial Monte Carlo source (source='diffusion' in main_esfr.py, see sample_sites in
+source_esfr.py) and as a quick-look power map. Better constants, e.g. from MGXS of the
+model, can be passed as constants.
+"""
+
+# D (cm), absorption and nu-fission (1/cm) of groups 1 and 2, and removal 1 -> 2 (1/cm)
+group_constants = {
+    'inner fuel':      {'D': (2.0, 1.1), 'absorption': (0.0035, 0.0085), 'nu_fission': (0.0042, 0.0105), 'removal': 0.012},
+    'outer fuel':      {'D': (2.0, 1.1), 'absorption': (0.0037, 0.0092), 'nu_fission': (0.0049, 0.0122), 'removal': 0.012},
+    'reflector':       {'D': (1.3, 0.8), 'absorption': (0.0012, 0.0040), 'nu_fission': (0., 0.),         'removal': 0.018},
+    # added per control rod pin position fraction
+    'boron carbide':   {'absorption': (0.020, 0.100)},
+    'follower':        {'absorption': (0.001, 0.004)},
+}
+
+# pin positions of an assembly (271), and fuel pins in the control rod assemblies
+n_positions = 271
+n_fuel_crod = 198
+
+def node_constants(kind, constants=group_constants):
+    """(D, absorption, nu_fission, removal) of a node of kind, e.g. 'inner CSD rodded'"""
+    if kind in ('radial reflector', 'axial reflector'):
+        c = constants['reflector']
+        return np.array(c['D']), np.array(c['absorption']), np.array(c['nu_fission']), c['removal']
+
+    fuel = constants['outer fuel' if kind.startswith('outer') else 'inner fuel']
+    D, absorption, nu_fission = np.array(fuel['D']), np.array(fuel['absorption']), np.array(fuel['nu_fission'])
+    if 'CSD' in kind or 'DSD' in kind:
+        # control rod assemblies: 73 of the fuel pins replaced by rods or followers
+        rod = (n_positions - n_fuel_crod) / n_positions
+        fraction = n_fuel_crod / (n_positions - 1)
+        absorber = constants['boron carbide' if kind.endswith('rodded') else 'follower']
+        absorption = fraction * absorption + rod * np.array(absorber['absorption'])
+        nu_fission = fraction * nu_fission
+    return D, absorption, nu_fission, fuel['removal']
+
+_assembly_kinds = {'iFA': 'inner fuel', 'oFA': 'outer fuel', 'radref': 'radial reflector',
+                   'CSDinner': 'inner CSD', 'CSDouter': 'outer CSD', 'DSD': 'inner DSD'}
+
+def axial_layers(p, dz=10.):
+    """z edges of the layers and their region: 'lower', 'fuel' or 'upper'"""
+    H = p['FA_height']
+    edges, regions = [], []
+    for region, z0, z1 in (('lower', -H/2 - p['h_bottom_ar'], -H/2), ('fuel', -H/2, H/2), ('upper', H/2, H/2 + p['h_top_ar'])):
+        n = max(1, int(np.ceil((z1 - z0) / dz)))
+        edges.append(np.linspace(z0, z1, n + 1)[:-1])
+        regions += [region] * n
+    return np.append(np.concatenate(edges), H/2 + p['h_top_ar']), regions
+
+def hex_neighbours(xy, pitch):
+    """index of the 6 neighbours of each element of a hex lattice with positions xy, -1 if none"""
+    index = {tuple(np.round(c, 3)): i for i, c in enumerate(xy)}
+    neighbours = -np.ones((len(xy), 6), dtype=int)
+    for k, angle in enumerate(np.radians(90. - 60. * np.arange(6))):
+        shifted = np.round(xy + pitch * np.array([np.cos(angle), np.sin(angle)]), 3)
+        neighbours[:, k] = [index.get(tuple(c), -1) for c in shifted]
+    return neighbours
+
+def solve(params=None, constants=group_constants, dz=10., tol=1e-7, max_outer=5000, inner=5):
+    """
+    Solve the two-group diffusion eigenvalue problem of the core for params.
+
+    Returns a dict with 'keff', the 'flux' (assemblies, layers, 2), the fission 'power'
+    (assemblies, layers) normalized to a mean of 1 over the fuel nodes, the assembly
+    positions 'xy', their 'kinds' (see node_constants), the axial 'z_edges' and 'regions'
+    of the layers and the number of 'iterations'.
+    """
+    p = default_params if params is None else params
+    core = build_core(p)
+
+    names = {uni.id: name for name, uni in core['assemblies'].items()}
+    xy = np.concatenate(ring_positions(len(core['core_uni_grid']), p['lattice_pitch'], 'y'))
+    kinds = [_assembly_kinds[names[uni.id]] for ring in core['core_uni_grid'] for uni in ring]
+    z_edges, layer_regions = axial_layers(p, dz)
+    n_a, n_z = len(xy), len(layer_regions)
+
+    # constants of every node (assembly, layer), control rods above the insertion depth
+    z_mid = (z_edges[:-1] + z_edges[1:]) / 2
+    z_rod = p['FA_height']/2 - p['crod_insertion_length']
+    D = np.empty((n_a, n_z, 2)); absorption = np.empty((n_a, n_z, 2))
+    nu_fission = np.empty((n_a, n_z, 2)); removal = np.empty((n_a, n_z))
+    for a, kind in enumerate(kinds):
+        for l, region in enumerate(layer_regions):
+            if region != 'fuel':
+                node = 'axial reflector'
+            elif 'CSD' in kind and z_mid[l] > z_rod:
+                node = kind + ' rodded'
+            else:
+                node = kind
+            D[a, l], absorption[a, l], nu_fission[a, l], removal[a, l] = node_constants(node, constants)
+
+    # coupling coefficients (1/cm) to the 6 radial and 2 axial neighbours, Marshak vacuum outside
+    pitch = p['lattice_pitch']
+    radial = hex_neighbours(xy, pitch)
+    h = pitch / 2
+    coupling = np.zeros((n_a, n_z, 8, 2))
+    for k in range(6):
+        j = radial[:, k]
+        D_j = np.where((j >= 0)[:, None, None], D[j], 0.)
+        c = np.where((j >= 0)[:, None, None], 1 / (h / D + h / np.where(D_j > 0, D_j, 1.)), 1 / (h / D + 2))
+        coupling[:, :, k] = c * 2 / (3 * pitch)
+    dz_l = np.diff(z_edges)[None, :, None]
+    for k, shift in ((6, -1), (7, +1)):
+        D_j = np.roll(D, -shift, axis=1)
+        dz_j = np.roll(dz_l, -shift, axis=1)
+        c = 1 / (dz_l / 2 / D + dz_j / 2 / D_j)
+        boundary = 0 if shift == -1 else n_z - 1
+        c[:, boundary] = 1 / (dz_l[:, boundary] / 2 / D[:, boundary] + 2)
+        coupling[:, :, k] = c / dz_l
+
+    # neighbour index of every node, n_a * n_z for vacuum (a zero flux entry)
+    node = np.arange(n_a * n_z).reshape(n_a, n_z)
+    neighbours = np.full((n_a, n_z, 8), n_a * n_z)
+    for k in range(6):
+        j = radial[:, k]
+        neighbours[:, :, k] = np.where((j >= 0)[:, None], node[np.maximum(j, 0)], n_a * n_z)
+    neighbours[:, 1:, 6] = node[:, :-1]
+    neighbours[:, :-1, 7] = node[:, 1:]
+
+    diagonal = absorption + coupling.sum(axis=2)
+    diagonal[..., 0] += removal
+
+    def jacobi(phi, source, g, n):
+        flat = np.append(phi.ravel(), 0.)
+        for i in range(n):
+            phi = (source + (coupling[..., g] * flat[neighbours]).sum(axis=2)) / diagonal[..., g]
+            flat[:-1] = phi.ravel()
+        return phi
+
+    flux = np.ones((n_a, n_z, 2))
+    fission = (nu_fission * flux).sum(axis=2)
+    keff = 1.
+    for iteration in range(1, max_outer + 1):
+        flux[..., 0] = jacobi(flux[..., 0], fission / keff, 0, inner)
+        flux[..., 1] = jacobi(flux[..., 1], removal * flux[..., 0], 1, inner)
+
+        new_fission = (nu_fission * flux).sum(axis=2)
+        new_keff = keff * new_fission.sum() / fission.sum()
+        converged = abs(new_keff - keff) < tol and np.abs(new_fission / new_fission.sum() - fission / fission.sum()).max() < tol
+        keff, fission = new_keff, new_fission
+        if converged:
+            break
+
+    fuel = fission > 0
+    return {'keff': keff,
+            'flux': flux,
+            'power': fission / fission[fuel].mean(),
+            'xy': xy,
+            'kinds': kinds,
+            'z_edges': z_edges,
+            'regions': layer_regions,
+            'iterations': iteration}
+
+def power_map(result):
+    """assembly powers (sum over the layers) normalized to a mean of 1 over the fuel assemblies"""
+    power = result['power'].sum(axis=1)
+    return power / power[power > 0].mean()
+
+def print_report(result):
+    power = power_map(result)
+    fuel = power > 0
+    print('diffusion keff = {:.5f} after {} iterations'.format(result['keff'], result['iterations']))
+    print('assembly peaking factor {:.3f}, node peaking factor {:.3f}'.format(
+          power.max(), result['power'].max()))
+    print('min/max assembly power {:.3f}/{:.3f} in {} fuel assemblies'.format(power[fuel].min(), power.max(), fuel.sum()))
+
+def plot_power_map(result):
+    import matplotlib.pyplot as plt
+
+    power = power_map(result)
+    fuel = power > 0
+    x, y = result['xy'][fuel].T
+    plt.figure(figsize=(8, 7))
+    scatter = plt.scatter(x, y, c=power[fuel], marker='h', s=90)
+    plt.colorbar(scatter, label='relative assembly power')
+    plt.gca().set_aspect('equal')
+    plt.xlabel('x [cm]')
+    plt.ylabel('y [cm]')
+    plt.title('Diffusion estimate of the assembly power in ESFR model (k = {:.4f})'.format(result['keff']))
+    plt.show()
+
+
+if __name__ == '__main__':
+    result = solve()
+    print_report(result)
+    plot_power_map(result)
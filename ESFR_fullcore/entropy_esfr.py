@@ -0,0 +1,138 @@
+import os
+import shutil
+import hashlib
+
+import numpy as np
+
+"""
+Inactive batches of the ESFR from the Shannon entropy of the fission source.
+
+Instead of a fixed 10 inactive batches, converge_source() runs inactive batches in chunks,
+each chunk starting from the fission source bank of the previous one, and collects the
+Shannon entropy of every batch on a mesh over the core_r x core_r x FA_height box. Once
+stationary_batch() finds that the entropy has settled, the source bank of the last chunk is
+stationary and the active batches start from it (inactive = 0). The entropy trace is
+saved in directory/entropy.txt.
+"""
+
+def entropy_mesh(p, particles, sites_per_bin=20):
+    """regular mesh over the fissionable box with about sites_per_bin source sites per bin"""
+    import openmc
+
+    width, height = 2 * p['core_r'], p['FA_height']
+    side = (width**2 * height / max(1, particles / sites_per_bin))**(1/3)
+
+    mesh = openmc.RegularMesh()
+    mesh.lower_left = [-p['core_r'], -p['core_r'], -height/2]
+    mesh.upper_right = [p['core_r'], p['core_r'], height/2]
+    mesh.dimension = [int(np.ceil(width / side))] * 2 + [int(np.ceil(height / side))]
+    return mesh
+
+def stationary_batch(entropy, window=5, n_sigma=2.):
+    """
+    first batch (0-based) from which the entropy stays stationary, None if not yet.
+
+    The last window batches are the reference level. The source is taken as stationary from
+    the first batch after which the running mean over window batches stays within n_sigma
+    standard deviations (of the running mean, from the batch to batch noise of the reference)
+    of the reference, provided that at least
+    window batches before the reference confirm it, so 2 * window batches are the least
+    that can be stationary.
+    """
+    entropy = np.asarray(entropy, dtype=float)
+    if len(entropy) < 2 * window:
+        return None
+
+    # the batch to batch noise from the differences, a drift still in the reference does not widen it
+    tail = entropy[-window:]
+    noise = np.diff(tail).std(ddof=1) / np.sqrt(2)
+    band = n_sigma * max(noise, 1e-12) / np.sqrt(window)
+    running = np.convolve(entropy, np.ones(window) / window, mode='valid')
+
+    outside = np.nonzero(np.abs(running - tail.mean()) > band)[0]
+    start = 0 if len(outside) == 0 else outside[-1] + window
+    return int(start) if start <= len(entropy) - 2 * window else None
+
+def _keep_source(source, directory):
+    """copy of a source bank named by its content, so runs from different banks hash differently"""
+    with open(source, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    path = os.path.abspath(os.path.join(directory, 'source_{}.h5'.format(digest)))
+    shutil.copy(source, path)
+    return path
+
+def converge_source(params=None, particles=10000, chunk=5, max_inactive=200, window=5,
+                    directory='entropy', source='box'):
+    """
+    Run inactive batches, chunk at a time, until the entropy is stationary, the first chunk
+    from the initial source of build_model (e.g. 'fuel' or 'diffusion', see source_esfr.py).
+
+    Returns the path of the stationary source bank, the entropy of every batch run and the
+    first stationary batch (None if max_inactive batches did not converge, then the source
+    of the last batch is returned).
+    """
+    import h5py
+    import openmc
+    from main_esfr import build_model
+    from structure_esfr import default_params
+
+    p = default_params if params is None else params
+    os.makedirs(directory, exist_ok=True)
+    workdir = os.path.join(directory, 'chunk')
+
+    entropy = []
+    initial, source = source, None
+    start = None
+    while len(entropy) < max_inactive:
+        # one active batch, as OpenMC needs one, and no tallies to score
+        model = build_model(p, particles=particles, batches=chunk, inactive=chunk - 1, source=initial)
+        model.settings.entropy_mesh = entropy_mesh(p, particles)
+        model.settings.sourcepoint = {'separate': True, 'write': True}
+        if source is not None:
+            model.settings.source = openmc.Source(filename=source)
+
+        sp_path = model.run(cwd=workdir, output=False)
+        with h5py.File(sp_path, 'r') as f:
+            entropy.extend(f['entropy'][()])
+        source = _keep_source(os.path.join(workdir, 'source.{}.h5'.format(chunk)), directory)
+
+        start = stationary_batch(entropy, window)
+        print('entropy: {} batches, H = {:.4f}, {}'.format(len(entropy), entropy[-1],
+              'stationary from batch {}'.format(start + 1) if start is not None else 'not stationary'))
+        if start is not None:
+            break
+
+    save_trace(entropy, start, directory)
+    return source, np.array(entropy), start
+
+def save_trace(entropy, start, directory='entropy'):
+    np.savetxt(os.path.join(directory, 'entropy.txt'), np.column_stack([np.arange(1, len(entropy) + 1), entropy]),
+               fmt=['%d', '%.6f'],
+               header='batch, Shannon entropy (stationary from batch {})'.format(start + 1 if start is not None else '-'))
+
+def load_trace(directory='entropy'):
+    batch, entropy = np.loadtxt(os.path.join(directory, 'entropy.txt'), unpack=True)
+    return batch.astype(int), entropy
+
+def plot_trace(directory='entropy'):
+    import matplotlib.pyplot as plt
+
+    batch, entropy = load_trace(directory)
+    plt.plot(batch, entropy, '.-')
+    plt.xlabel('Batch')
+    plt.ylabel('Shannon entropy')
+    plt.title('Fission source convergence in ESFR model')
+    plt.show()
+
+
+if __name__ == '__main__':
+    import openmc
+    from main_esfr import build_model
+    from run_cache import cached_run
+
+    source, entropy, start = converge_source()
+
+    # active batches only, starting from the stationary source
+    model = build_model(batches=90, inactive=0)
+    model.settings.source = openmc.Source(filename=source)
+    cached_run(model, copy_to='.')
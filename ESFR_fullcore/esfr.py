@@ -0,0 +1,391 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# run_cache.py and the other shared modules, imported by the commands that need them
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+
+"""
+Entry point for the ESFR scripts:
+
+    python esfr.py run                      full core eigenvalue run (main_esfr.py)
+                  [--keff-pcm P] [--tally-rel-err NAME E]   stop once these are reached
+                  [--source fuel|cosine|diffusion]  initial source sampled in the fuel pins (source_esfr.py)
+                  [--sectors 3|6]         1/3 or 1/6 sector with periodic boundaries (sector_esfr.py)
+                  [--tallies [mesh|lattice|pin-power]]  flux and prompt neutron tallies on the xy mesh or
+                                          per assembly and pin, or fission power per fuel pin
+                  [--auto-inactive]       inactive batches until the entropy is stationary (entropy_esfr.py)
+                  [--estimate]            only estimate tally memory and statepoint size (tally_budget.py)
+                  [--compact [NAME ...]]  only these tallies, no source bank or tallies.out (compact_output.py)
+                  [--statepoint-batches B ...] [--keep-source] [--archive PATH]
+    python esfr.py mgxs                     MGXS library and multigroup vs continuous energy report (mgxs_esfr.py)
+    python esfr.py volumes [--check]        analytical material volumes, optionally checked stochastically (volumes_esfr.py)
+    python esfr.py simplify                 particles/s with and without implied half-spaces (simplify_geometry.py)
+    python esfr.py deduplicate              objects and geometry.xml size with identical universes merged
+    python esfr.py diffusion                two-group diffusion keff and power map (diffusion_esfr.py)
+    python esfr.py search                   control rod criticality search (search_esfr.py)
+    python esfr.py plot-geometry            xy and xz geometry plots (plotting_esfr.py)
+    python esfr.py plot-flux [statepoint]   flux and prompt neutron maps (tally_processing.py),
+                  [--window X0 X1 Y0 Y1]  optionally only of a window of the core
+                  [--sectors 3|6]         unfolded from a sector run
+                  [--lattice]             per assembly and fuel pin (lattice_tallies.py)
+    python esfr.py pin-power [statepoint]   assembly powers and peaking factors (pin_power_esfr.py)
+    python esfr.py deplete [--max-steps N]  depletion, resumed from the last completed step (depletion_esfr.py)
+                  [--walltime S]
+    python esfr.py archive sp archive       float32 means and errors of selected tallies (tally_archive.py)
+    python esfr.py plot-depletion [results] keff(t) or Pu239/U235 ratio (depl_processing.py)
+    python esfr.py keff [file]              print keff of a statepoint or depletion results
+    python esfr.py startup                  measure the import time of every command
+
+Every command imports only the modules it needs, so e.g. `keff` or `plot-depletion`
+neither import openmc nor build the geometry.
+"""
+
+# modules imported by each command, and the import time budget (s) of the command
+command_modules = {'keff':           ['h5py'],
+                   'archive':        ['tally_archive'],
+                   'plot-depletion': ['depl_processing'],
+                   'plot-flux':      ['tally_processing'],
+                   'plot-geometry':  ['plotting_esfr'],
+                   'run':            ['main_esfr'],
+                   'search':         ['search_esfr'],
+                   'deplete':        ['depletion_esfr'],
+                   'diffusion':      ['diffusion_esfr'],
+                   'mgxs':           ['mgxs_esfr'],
+                   'volumes':        ['volumes_esfr'],
+                   'simplify':       ['main_esfr'],
+                   'deduplicate':    ['main_esfr'],
+                   'pin-power':      ['pin_power_esfr']}
+
+import_budget = {'keff':           0.5,
+                 'archive':        0.5,
+                 'plot-depletion': 2.0,
+                 'plot-flux':      2.0,
+                 'plot-geometry':  4.0,
+                 'run':            4.0,
+                 'search':         4.0,
+                 'deplete':        0.5,
+                 'diffusion':      4.0,
+                 'mgxs':           4.0,
+                 'volumes':        4.0,
+                 'simplify':       4.0,
+                 'deduplicate':    4.0,
+                 'pin-power':      4.0}
+
+# modules that quick commands should not pay for
+heavy_modules = ['openmc', 'matplotlib', 'structure_esfr']
+
+
+def cmd_run(args):
+    import openmc
+    from main_esfr import build_model, add_triggers, histories_report
+    from run_cache import cached_run
+
+    if args.auto_inactive and args.sectors:
+        sys.exit('--auto-inactive converges the source of the full core, not of a sector')
+    if (args.statepoint_batches or args.keep_source) and args.compact is None:
+        sys.exit('--statepoint-batches and --keep-source are options of --compact')
+
+    # without --batches a run with targets checks them from trigger_first_active active batches on
+    triggered = args.keff_pcm is not None or args.tally_rel_err
+    batches = args.batches if args.batches is not None else 100
+    model = build_model(particles=args.particles, batches=batches, inactive=args.inactive,
+                        tallies=args.tallies or ('lattice' if args.tally_rel_err else False),
+                        source=args.source, sectors=args.sectors)
+
+    if args.auto_inactive and not args.estimate:
+        from entropy_esfr import converge_source
+
+        # inactive batches until the entropy is stationary, then the same number of active batches
+        source, entropy, start = converge_source(particles=args.particles, source=args.source or 'box')
+        model.settings.source = openmc.Source(filename=source)
+        model.settings.batches = batches - args.inactive
+        model.settings.inactive = 0
+        print('{} inactive batches run instead of {}, entropy trace in entropy/entropy.txt'.format(
+              len(entropy), args.inactive))
+
+    if triggered:
+        add_triggers(model, keff_pcm=args.keff_pcm,
+                     tally_rel_err={name: float(rel_err) for name, rel_err in args.tally_rel_err or []},
+                     max_batches=args.max_batches, first_batch=model.settings.batches if args.batches is not None else None)
+
+    if args.compact is not None:
+        from compact_output import compact
+        compact(model, tallies=args.compact or None, statepoint_batches=args.statepoint_batches,
+                source=args.keep_source)
+
+    if args.estimate:
+        from tally_budget import estimate, print_estimate
+        print_estimate(*estimate(model))
+        return
+
+    if args.no_cache:
+        from tally_budget import check
+        check(model)
+        sp_path = model.run()
+    else:
+        # with --archive the statepoint stays in the run cache only
+        sp_path = cached_run(model, copy_to=None if args.archive else '.')
+        if triggered:
+            histories_report(sp_path, fixed_batches=args.fixed_batches)
+
+    if args.archive:
+        from compact_output import archive
+        archive(sp_path, args.archive, tallies=args.compact or None)
+        print('float32 tallies of {} written to {}'.format(sp_path, args.archive))
+
+def cmd_search(args):
+    from search_esfr import crod_search
+
+    result = crod_search(bracket=(args.lower, args.upper))
+    print('control rod insertion for criticality: {:.3f} cm'.format(result['insertion']))
+    print('keff = {:.5f} +/- {:.5f}, {} histories'.format(result['keff'], result['std'], result['histories']))
+
+def cmd_deplete(args):
+    from depletion_esfr import deplete, time_steps, chain_path
+
+    # exit status 3 while steps are left, e.g. for a job script to resubmit itself
+    n_done = deplete(chain=args.chain or chain_path, directory=args.directory, max_steps=args.max_steps, walltime=args.walltime)
+    print('{} of {} depletion steps completed'.format(n_done, len(time_steps)))
+    return 0 if n_done == len(time_steps) else 3
+
+def cmd_mgxs(args):
+    from mgxs_esfr import compare
+
+    compare(library=args.library, directory=args.directory, tolerance=args.tolerance * 1e-5,
+            particles=args.particles, batches=args.batches, inactive=args.inactive)
+
+def cmd_volumes(args):
+    from volumes_esfr import material_volumes, check_volumes
+
+    for material, volume in material_volumes().items():
+        print('{:24s} {:14.6g} cm3'.format(material.name, volume))
+    if args.check:
+        print()
+        check_volumes(samples=args.samples, threads=args.threads)
+
+def cmd_simplify(args):
+    from main_esfr import build_model
+    from simplify_geometry import measure
+
+    measure(build_model(particles=args.particles, batches=args.batches, inactive=args.inactive, simplify=False))
+
+def cmd_deduplicate(args):
+    from main_esfr import build_model
+    from deduplicate_geometry import report
+
+    report(build_model(deduplicate=False).geometry)
+
+def cmd_diffusion(args):
+    from diffusion_esfr import solve, print_report, plot_power_map
+
+    result = solve(dz=args.dz)
+    print_report(result)
+    if not args.no_plot:
+        plot_power_map(result)
+
+def cmd_pin_power(args):
+    from pin_power_esfr import pin_powers, save_pin_powers, peaking_factors, print_report
+
+    result = pin_powers(args.statepoint)
+    if args.save:
+        save_pin_powers(result, args.save)
+    print_report(peaking_factors(result, total_power=args.power))
+
+def cmd_plot_geometry(args):
+    from plotting_esfr import plot_geometry
+    plot_geometry()
+
+def cmd_plot_flux(args):
+    if args.lattice:
+        from tally_processing import plot_lattice_maps
+        plot_lattice_maps(args.statepoint)
+    else:
+        from tally_processing import plot_maps
+        plot_maps(args.statepoint, window=args.window, sectors=args.sectors)
+
+def cmd_archive(args):
+    from tally_archive import export_archive
+
+    index = export_archive(args.statepoint, args.archive, names=args.tally, scores=args.score,
+                           compression=None if args.no_compression else 'gzip')
+    for entry in index:
+        print('{:20s} {:20s} {}'.format(entry['name'], entry['score'], 'x'.join(map(str, entry['shape']))))
+
+def cmd_plot_depletion(args):
+    import depl_processing
+
+    if args.conversion_ratio:
+        depl_processing.plot_conversion_ratio(args.results)
+    else:
+        depl_processing.plot_keff(args.results)
+
+def cmd_keff(args):
+    import h5py
+
+    with h5py.File(args.file, 'r') as f:
+        if 'k_combined' in f:
+            # statepoint
+            k, k_std = f['k_combined'][()]
+            print('Combined k-effective = {:.5f} +/- {:.5f}'.format(k, k_std))
+        else:
+            # depletion results, first stage of every step
+            time = f['time'][:, 0] / (24*60*60)
+            k = f['eigenvalues'][:, 0]
+            for t, (k_mean, k_std) in zip(time, k):
+                print('{:8.1f} d   k-effective = {:.5f} +/- {:.5f}'.format(t, k_mean, k_std))
+
+def cmd_startup(args):
+    """import every command's modules in a fresh interpreter and compare against the budget"""
+    code = ('import sys, time\n'
+            't0 = time.perf_counter()\n'
+            'import esfr, {modules}\n'
+            'dt = time.perf_counter() - t0\n'
+            'print(dt, *[name for name in {heavy!r} if name in sys.modules])\n')
+
+    over_budget = False
+    print('{:16s} {:>9s} {:>9s}   loaded'.format('command', 'import', 'budget'))
+    for command, modules in command_modules.items():
+        times = []
+        for i in range(args.repeat):
+            output = subprocess.run([sys.executable, '-c', code.format(modules=', '.join(modules), heavy=heavy_modules)],
+                                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                                    check=True, capture_output=True, text=True).stdout.split()
+            times.append(float(output[0]))
+        loaded = output[1:]
+
+        dt = min(times)
+        over_budget |= dt > import_budget[command]
+        print('{:16s} {:8.3f}s {:8.3f}s   {}{}'.format(command, dt, import_budget[command], ', '.join(loaded) or '-',
+                                                  '   OVER BUDGET' if dt > import_budget[command] else ''))
+
+    return 1 if over_budget else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ESFR full core model and processing')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='full core eigenvalue run')
+    run.add_argument('--particles', type=int, default=10000)
+    run.add_argument('--batches', type=int, default=None,
+                     help='batches (default 100), with --keff-pcm or --tally-rel-err the first batch the targets'
+                          ' are checked at (default 20 after the inactive ones)')
+    run.add_argument('--inactive', type=int, default=10)
+    run.add_argument('--source', choices=['box', 'fuel', 'cosine', 'diffusion'], default=None,
+                     help='initial source: uniform in the core box, or sampled in the fuel pins (source_esfr.py)'
+                          ' uniformly, with a cosine shape or the diffusion power shape (default box, fuel for --sectors)')
+    run.add_argument('--sectors', type=int, choices=[3, 6], default=None,
+                     help='run a 1/3 or 1/6 sector of the core with periodic boundaries (sector_esfr.py)')
+    run.add_argument('--auto-inactive', action='store_true',
+                     help='run inactive batches until the Shannon entropy is stationary instead of --inactive')
+    run.add_argument('--tallies', nargs='?', const='mesh', choices=['mesh', 'lattice', 'pin-power'], default=None,
+                     help='with the flux and prompt neutron tallies on the xy mesh (default) or per assembly and'
+                          ' fuel pin (lattice_tallies.py), or the fission power per fuel pin (pin_power_esfr.py)')
+    run.add_argument('--keff-pcm', type=float, default=None, help='stop when the std of keff is below this (pcm)')
+    run.add_argument('--tally-rel-err', nargs=2, action='append', metavar=('NAME', 'REL_ERR'),
+                     help='stop when the largest relative error of tally NAME is below REL_ERR, e.g. of'
+                          " 'pins inner fuel' (the default tallies with targets are --tallies lattice)")
+    run.add_argument('--max-batches', type=int, default=300, help='batch ceiling of a run with targets')
+    run.add_argument('--fixed-batches', type=int, default=100, help='fixed schedule to report the savings against')
+    run.add_argument('--no-cache', action='store_true', help='run even if this model is in the run cache')
+    run.add_argument('--estimate', action='store_true',
+                     help='only print the tally memory and statepoint size of the run (tally_budget.py)')
+    run.add_argument('--compact', nargs='*', metavar='NAME', default=None,
+                     help='compact output (compact_output.py): only the named tallies (all if none) in the statepoints,'
+                          ' no source bank and no tallies.out')
+    run.add_argument('--statepoint-batches', type=int, nargs='+', default=[], metavar='B',
+                     help='with --compact, intermediate statepoints at these batches besides the last')
+    run.add_argument('--keep-source', action='store_true', help='with --compact, the source bank in the last statepoint')
+    run.add_argument('--archive', default=None, metavar='PATH',
+                     help='float32 means and relative errors of the written tallies in this tally archive')
+    run.set_defaults(func=cmd_run)
+
+    search = commands.add_parser('search', help='control rod criticality search')
+    search.add_argument('--lower', type=float, default=0., help='lower insertion bracket (cm)')
+    search.add_argument('--upper', type=float, default=100., help='upper insertion bracket (cm)')
+    search.set_defaults(func=cmd_search)
+
+    deplete = commands.add_parser('deplete', help='depletion, resumed from the last completed step')
+    deplete.add_argument('--chain', default=None, help='depletion chain file')
+    deplete.add_argument('--directory', default='.', help='directory of depletion_results.h5')
+    deplete.add_argument('--max-steps', type=int, default=None, help='number of steps to do in this job')
+    deplete.add_argument('--walltime', type=float, default=None,
+                         help='time (s) left for this job, no step is started that would not finish in time')
+    deplete.set_defaults(func=cmd_deplete)
+
+    mgxs = commands.add_parser('mgxs', help='multigroup cross sections and multigroup runs of variants')
+    mgxs.add_argument('--library', default=None, help='existing MGXS library of the reference fuels, generated if not given')
+    mgxs.add_argument('--directory', default='mgxs')
+    mgxs.add_argument('--tolerance', type=float, default=300., help='keff difference (pcm) for MG to be trusted')
+    mgxs.add_argument('--particles', type=int, default=10000)
+    mgxs.add_argument('--batches', type=int, default=100)
+    mgxs.add_argument('--inactive', type=int, default=10)
+    mgxs.set_defaults(func=cmd_mgxs)
+
+    volumes = commands.add_parser('volumes', help='analytical material volumes')
+    volumes.add_argument('--check', action='store_true', help='compare with a stochastic volume calculation')
+    volumes.add_argument('--samples', type=int, default=10000000)
+    volumes.add_argument('--threads', type=int, default=None)
+    volumes.set_defaults(func=cmd_volumes)
+
+    simplify = commands.add_parser('simplify', help='measure the geometry without implied half-spaces')
+    simplify.add_argument('--particles', type=int, default=10000)
+    simplify.add_argument('--batches', type=int, default=20)
+    simplify.add_argument('--inactive', type=int, default=5)
+    simplify.set_defaults(func=cmd_simplify)
+
+    deduplicate = commands.add_parser('deduplicate', help='merge identical universes and lattices of the geometry')
+    deduplicate.set_defaults(func=cmd_deduplicate)
+
+    diffusion = commands.add_parser('diffusion', help='two-group diffusion keff and assembly power map')
+    diffusion.add_argument('--dz', type=float, default=10., help='axial node height (cm)')
+    diffusion.add_argument('--no-plot', action='store_true')
+    diffusion.set_defaults(func=cmd_diffusion)
+
+    pin_power = commands.add_parser('pin-power', help='assembly powers and peaking factors from the pin power tallies')
+    pin_power.add_argument('statepoint', nargs='?', default='statepoint.100.h5', help='statepoint or tally archive')
+    pin_power.add_argument('--save', default=None, help='write the (assembly, pin) arrays to this .npz file')
+    pin_power.add_argument('--power', type=float, default=3600e6, help='total thermal power (W)')
+    pin_power.set_defaults(func=cmd_pin_power)
+
+    plot_geometry = commands.add_parser('plot-geometry', help='xy and xz geometry plots')
+    plot_geometry.set_defaults(func=cmd_plot_geometry)
+
+    plot_flux = commands.add_parser('plot-flux', help='flux and prompt neutron maps')
+    plot_flux.add_argument('statepoint', nargs='?', default='tallies10000particles.100.h5')
+    plot_flux.add_argument('--window', type=float, nargs=4, metavar=('X0', 'X1', 'Y0', 'Y1'),
+                           help='only read and plot this part of the core (cm)')
+    plot_flux.add_argument('--sectors', type=int, choices=[3, 6], default=None,
+                           help='unfold the tallies of a sector run to the full core')
+    plot_flux.add_argument('--lattice', action='store_true', help='maps of the assembly and pin tallies (run --tallies lattice)')
+    plot_flux.set_defaults(func=cmd_plot_flux)
+
+    archive = commands.add_parser('archive', help='store the means of selected tallies in a compact archive')
+    archive.add_argument('statepoint')
+    archive.add_argument('archive')
+    archive.add_argument('--tally', action='append', help='name of a tally to keep (all if not given)')
+    archive.add_argument('--score', action='append', help='score to keep (all if not given)')
+    archive.add_argument('--no-compression', action='store_true', help='uncompressed, memory mapped on reading')
+    archive.set_defaults(func=cmd_archive)
+
+    plot_depletion = commands.add_parser('plot-depletion', help='keff over time or conversion ratio')
+    plot_depletion.add_argument('results', nargs='?', default='depletion_results.h5')
+    plot_depletion.add_argument('--conversion-ratio', action='store_true', help='plot Pu239/U235 instead of keff')
+    plot_depletion.set_defaults(func=cmd_plot_depletion)
+
+    keff = commands.add_parser('keff', help='print keff of a statepoint or depletion results')
+    keff.add_argument('file', nargs='?', default='statepoint.100.h5')
+    keff.set_defaults(func=cmd_keff)
+
+    startup = commands.add_parser('startup', help='measure the import time of every command')
+    startup.add_argument('--repeat', type=int, default=3)
+    startup.set_defaults(func=cmd_startup)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
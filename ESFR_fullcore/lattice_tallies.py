@@ -0,0 +1,135 @@
+import numpy as np
+
+import openmc
+
+from structure_esfr import build_core, default_params, fuels, ring_positions
+
+"""
+Tallies per assembly of core_lat and per fuel pin, instead of the 1000x1000 xy mesh.
+
+The mesh of make_tallies in main_esfr.py has a million bins, most of them in sodium and
+reflector, and cuts the pins in pieces. Here a DistribcellFilter on the cell of every
+assembly universe gives one bin per assembly of that type (817 in total), and one on the
+fuel cell of the inner and outer fuel pins one bin per fuel pin of the standardFA and
+crod_array lattices (128844), so the maps are per physical region at an eighth of the bins.
+
+The bins of a distribcell tally are the instances of the cell in OpenMC's order: depth first
+through the geometry, the lattice elements in the order of Lattice._natural_indices.
+instance_positions() walks the geometry the same way and returns the (x, y) of every
+instance as an array, memoized per universe, so a tally maps to positions by indexing. The
+means are read with statepoint_reader.read_tally or, float32, from a tally archive.
+"""
+
+scores = ['flux', 'prompt-nu-fission']
+
+def _positions(universe, cell_id, memo):
+    """(n, 2) positions of the instances of cell_id relative to the origin of universe"""
+    if universe.id in memo:
+        return memo[universe.id]
+
+    parts = []
+    for cell in universe.cells.values():
+        if cell.id == cell_id:
+            parts.append(np.zeros((1, 2)))
+        elif isinstance(cell.fill, openmc.Universe):
+            if cell.rotation is not None:
+                raise ValueError('cell {} rotates its fill, instance positions are only computed for translations'.format(cell.id))
+            offset = np.zeros(2) if cell.translation is None else np.asarray(cell.translation)[:2]
+            parts.append(_positions(cell.fill, cell_id, memo) + offset)
+        elif isinstance(cell.fill, openmc.Lattice):
+            lattice = cell.fill
+            for index in lattice._natural_indices:
+                child = _positions(lattice.get_universe(index), cell_id, memo)
+                if len(child):
+                    center = -np.asarray(lattice.get_local_coordinates((0., 0., 0.), index))[:2]
+                    parts.append(child + center)
+    memo[universe.id] = np.concatenate(parts) if parts else np.zeros((0, 2))
+    return memo[universe.id]
+
+def instance_positions(geometry, cell):
+    """(x, y) of every instance of cell in geometry, in the order of the bins of a DistribcellFilter"""
+    return _positions(geometry.root_universe, cell.id, {})
+
+def lattice_cells(geometry, params=None):
+    """
+    {name: cell} of the cells tallied by instance: 'assemblies <assembly universe name>' for the
+    cell of every assembly universe of core_lat and 'pins inner fuel' and 'pins outer fuel' for
+    the fuel cells
+    """
+    p = default_params if params is None else params
+    core_lat = next(lattice for lattice in geometry.get_all_lattices().values() if lattice.name == 'fullcore')
+
+    cells = {}
+    for universe in core_lat.get_unique_universes().values():
+        cell, = universe.cells.values()
+        cells['assemblies ' + universe.name] = cell
+    for name, fuel in zip(('inner fuel', 'outer fuel'), fuels(p)):
+        for cell in geometry.get_all_material_cells().values():
+            if cell.fill is fuel:
+                cells['pins ' + name] = cell
+    return cells
+
+def lattice_tally_requests(geometry, params=None, scores=scores):
+    """(name, filters, scores) of the assembly and pin tallies, see tally_planner.py"""
+    return [(name, [openmc.DistribcellFilter(cell)], list(scores))
+            for name, cell in lattice_cells(geometry, params).items()]
+
+def tally_positions(params=None):
+    """{tally name: (x, y) positions of its bins} of the lattice tallies of the core for params"""
+    p = default_params if params is None else params
+    geometry = build_core(p)['geometry']
+    return {name: instance_positions(geometry, cell) for name, cell in lattice_cells(geometry, p).items()}
+
+def _skewed(xy, pitch, orientation):
+    """integer skewed (x, alpha) indices of the hex lattice elements nearest to the points xy"""
+    x, y = xy[..., 0] / pitch, xy[..., 1] / pitch
+    if orientation == 'y':
+        q = x / (np.sqrt(3) / 2)
+        r = y - q / 2
+    else:
+        r = y / (np.sqrt(3) / 2)
+        q = x - r / 2
+
+    # rounding in cube coordinates (q + r + s = 0), the component furthest off is recomputed
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(int), rr.astype(int)
+
+def ring_index(xy, pitch, orientation, n_rings):
+    """
+    index of the element of a 2D HexLattice (centered at the origin) containing each point of
+    xy (n, 2), in ring order as np.concatenate(lattice.universes) and ring_positions, -1 outside
+    """
+    def key(q, r):
+        return (q + 2 * n_rings) * (4 * n_rings) + (r + 2 * n_rings)
+
+    reference = key(*_skewed(np.concatenate(ring_positions(n_rings, pitch, orientation)), pitch, orientation))
+    sorter = np.argsort(reference)
+    keys = key(*_skewed(np.asarray(xy, dtype=float), pitch, orientation))
+    index = sorter[np.clip(np.searchsorted(reference, keys, sorter=sorter), 0, len(reference) - 1)]
+    return np.where(reference[index] == keys, index, -1)
+
+def lattice_map(read_tally, path, level='pins', score='flux', params=None):
+    """
+    values and (x, y) positions of all bins of the 'assemblies' or 'pins' tallies in the
+    statepoint or archive path, read_tally is statepoint_reader.read_tally or
+    tally_archive.read_tally
+    """
+    positions = tally_positions(params)
+    names = [name for name in positions if name.startswith(level + ' ')]
+    values = np.concatenate([np.ravel(read_tally(path, name=name, score=score)) for name in names])
+    return values, np.concatenate([positions[name] for name in names])
+
+
+if __name__ == '__main__':
+    mesh_bins = 1000 * 1000
+    positions = tally_positions()
+    for name, xy in positions.items():
+        print('{:32s} {:8d} bins'.format(name, len(xy)))
+    total = sum(len(xy) for xy in positions.values())
+    print('{:32s} {:8d} bins, {:.1%} of the {} mesh bins'.format('total', total, total / mesh_bins, mesh_bins))
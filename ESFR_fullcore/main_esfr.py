@@ -1,62 +1,124 @@
-import matplotlib.pyplot as plt 
-import openmc
-import openmc.deplete
-import numpy as np 
+import os
+import sys
+import warnings
 
-from structure_esfr import core_r, FA_height, geometry, fuel_outer_d, clad_outer_d, crod_insertion_length, geometry
+import openmc
 
-from matter_esfr import inner_fuel, outer_fuel, sodium, clad_mat, EM10, follower, boron_carbide
+from structure_esfr import build_core, default_params, fuels
+from volumes_esfr import material_volumes
 
-# calculating volume
-n_iFA = 225
-n_oFA = 228
-n_iCSD = 6
-n_oCSD = 18
+import matter_esfr as matter
 
-n_pins_FA = 270
-n_pins_CSD = 198
-n_crods_CSD = 73
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from run_cache import cached_run
+import simplify_geometry
+import deduplicate_geometry
+import tally_planner
 
-volume_innerfuel = ( n_iFA * n_pins_FA + n_iCSD * n_pins_CSD ) * FA_height * np.pi * fuel_outer_d
-volume_outerfuel = ( n_oFA * n_pins_FA + n_oCSD * n_pins_CSD ) * FA_height * np.pi * fuel_outer_d
-volume_crods     = ( n_iCSD + n_oCSD ) * n_crods_CSD * crod_insertion_length * np.pi * clad_outer_d
+##################################################
+################### MATERIALS ####################
+##################################################
 
-inner_fuel.volume = volume_innerfuel
-outer_fuel.volume = volume_outerfuel
-boron_carbide.volume = volume_crods
+def make_materials(p, sectors=None):
+    """
+    materials of the core for the parameters p, with volumes of the burnable materials
+    (in a 1/sectors sector of the core if sectors)
+    """
+    inner_fuel, outer_fuel = fuels(p)
 
+    # calculating volume, from the pins and assemblies in the lattices (see volumes_esfr.py)
+    volumes = material_volumes(p)
+    fraction = 1. / sectors if sectors else 1.
+    inner_fuel.volume = volumes[inner_fuel] * fraction
+    outer_fuel.volume = volumes[outer_fuel] * fraction
+    matter.boron_carbide.volume = volumes[matter.boron_carbide] * fraction
 
-# exports
-materials_file = openmc.Materials([inner_fuel, outer_fuel, sodium, clad_mat, EM10, follower, boron_carbide])
-materials_file.export_to_xml()
-geometry.export_to_xml()
+    return openmc.Materials([inner_fuel, outer_fuel, matter.sodium, matter.clad_mat, matter.EM10,
+                             matter.follower, matter.boron_carbide])
 
 ##################################################
 ################### SETTINGS #####################
 ##################################################
 
-
-#point = openmc.stats.Point((0,0,0))
-#source = openmc.Source(space=point)
-
-# specifing wanted statistics and runs
-
-
-# creating initial uniform spatial source distribution over fissionable zones
-x1 = core_r
-y1 = x1
-z1 = FA_height/2
-
-bounds = [-x1, -y1, -z1, x1, y1, z1]
-uniform_dist = openmc.stats.Box(bounds[:3], bounds[3:], 
-                                only_fissionable=True)
-
-settings = openmc.Settings()
-settings.batches = 100
-settings.inactive = 10
-settings.particles = 10000
-settings.source = openmc.Source(space=uniform_dist)
-settings.export_to_xml()
+def make_settings(p, particles=10000, batches=100, inactive=10, source='box', sectors=None):
+    """
+    eigenvalue settings, with an initial source that is uniform over the fissionable zones
+    of the core box (source='box'), or sampled in the fuel pins uniformly (source='fuel'),
+    with a cosine shape (source='cosine') or with the power shape of a diffusion estimate
+    (source='diffusion'), see source_esfr.py and diffusion_esfr.py; the fuel pin sources are
+    folded into the sector of a sector model (see sector_esfr.py)
+    """
+
+    #point = openmc.stats.Point((0,0,0))
+    #source = openmc.Source(space=point)
+
+    # creating initial uniform spatial source distribution over fissionable zones
+    x1 = p['core_r']
+    y1 = x1
+    z1 = p['FA_height']/2
+
+    bounds = [-x1, -y1, -z1, x1, y1, z1]
+    uniform_dist = openmc.stats.Box(bounds[:3], bounds[3:],
+                                    only_fissionable=True)
+
+    # specifing wanted statistics and runs
+    settings = openmc.Settings()
+    settings.batches = batches
+    settings.inactive = inactive
+    settings.particles = particles
+    if source == 'box' and sectors:
+        raise ValueError("the box source is not limited to the sector, use source='fuel', 'cosine' or 'diffusion'")
+    elif source == 'box':
+        settings.source = openmc.Source(space=uniform_dist)
+    elif source in ('fuel', 'cosine'):
+        from source_esfr import fuel_source
+        settings.source = fuel_source(particles, p, cosine=source == 'cosine', sectors=sectors)
+    elif source == 'diffusion':
+        from source_esfr import fuel_source
+        from diffusion_esfr import solve
+        settings.source = fuel_source(particles, p, power=solve(p), sectors=sectors)
+    else:
+        raise ValueError("source must be one of 'box', 'fuel', 'cosine' and 'diffusion'")
+    return settings
+
+def build_model(params=None, particles=10000, batches=100, inactive=10, tallies=False, source=None,
+                simplify=True, deduplicate=True, sectors=None):
+    """
+    full core model for params (see structure_esfr.core_params), with the mesh tallies if
+    tallies (True or 'mesh'), the assembly and pin tallies of lattice_tallies.py if
+    tallies='lattice' or the pin power tallies of pin_power_esfr.py if tallies='pin-power',
+    without the half-spaces implied by the enclosing cells if simplify (see
+    common/simplify_geometry.py) and with identical universes and lattices merged if
+    deduplicate (see common/deduplicate_geometry.py).
+
+    sectors = 3 or 6 builds a 1/sectors sector of the core with periodic boundaries instead
+    (see sector_esfr.py), with the source in the fuel pins unless source is given.
+    """
+    p = default_params if params is None else params
+    if source is None:
+        source = 'fuel' if sectors else 'box'
+
+    model = openmc.model.Model()
+    if sectors:
+        from sector_esfr import sector_geometry
+        model.geometry = sector_geometry(build_core(p), sectors)
+    else:
+        model.geometry = build_core(p)['geometry']
+    if simplify:
+        model.geometry, removed = simplify_geometry.simplify(model.geometry)
+    if deduplicate:
+        model.geometry, merged = deduplicate_geometry.deduplicate(model.geometry)
+    model.materials = make_materials(p, sectors)
+    model.settings = make_settings(p, particles, batches, inactive, source, sectors)
+    if tallies == 'lattice':
+        from lattice_tallies import lattice_tally_requests
+        model.tallies = tally_planner.plan(lattice_tally_requests(model.geometry, p))
+    elif tallies == 'pin-power':
+        from pin_power_esfr import pin_power_requests
+        model.tallies = tally_planner.plan(pin_power_requests(model.geometry, p))
+    elif tallies:
+        model.tallies = make_tallies(p)
+    return model
 
 
 ##################################################
@@ -67,59 +129,88 @@ settings.export_to_xml()
 
 ####### NEUTRON FLUX #############################
 
-"""
-tallies_file = openmc.Tallies()
-
-# Create mesh which will be used for tally
-mesh = openmc.RegularMesh()
-mesh.dimension = [1000,1000]
-mesh.lower_left = [-core_r, -core_r]
-mesh.upper_right = [core_r, core_r]
-
-mesh_filter = openmc.MeshFilter(mesh)
+def tally_requests(p, dimension=(1000, 1000)):
+    """(name, filters, scores) of the neutron flux and prompt neutron production on an xy mesh over the core"""
+    # Create mesh which will be used for tally
+    mesh = openmc.RegularMesh()
+    mesh.dimension = list(dimension)
+    mesh.lower_left = [-p['core_r'], -p['core_r']]
+    mesh.upper_right = [p['core_r'], p['core_r']]
+
+    mesh_filter = openmc.MeshFilter(mesh)
+
+    return [("Neutron flux", [mesh_filter], ['flux']),
+            ("prompt n", [mesh_filter], ['prompt-nu-fission'])]
+
+def make_tallies(p, dimension=(1000, 1000)):
+    """
+    tallies of tally_requests, the requests on the same filters merged into one tally
+    (see tally_planner.py), which the processing scripts still find by the requested names
+    """
+    return tally_planner.plan(tally_requests(p, dimension))
+
+####### TRIGGERS #################################
+
+# active batches before the targets of a triggered run are first checked
+trigger_first_active = 20
+
+def add_triggers(model, keff_pcm=None, tally_rel_err=None, max_batches=300, interval=5, first_batch=None):
+    """
+    Stop the run once the std of keff is below keff_pcm (pcm) and the largest relative error
+    of every tally named in tally_rel_err = {name: rel_err} is below its target.
+
+    settings.batches becomes the first batch at which the targets are checked, first_batch or
+    trigger_first_active batches after the inactive ones, then every interval batches up to
+    max_batches.
+
+    A relative error target covers every bin of the tally. On the xy mesh tallies ('Neutron
+    flux', 'prompt n') that includes the nearly empty sodium and reflector bins, which hardly
+    ever reach it, so the run goes on to max_batches; the fuel pin tallies of
+    lattice_tallies.py ('pins inner fuel', 'pins outer fuel') only have fuel bins.
+    """
+    if keff_pcm is not None:
+        model.settings.keff_trigger = {'type': 'std_dev', 'threshold': keff_pcm * 1e-5}
+
+    for name, rel_err in (tally_rel_err or {}).items():
+        tally = tally_planner.find(model.tallies, name)
+        if any(isinstance(f, openmc.MeshFilter) for f in tally.filters):
+            warnings.warn('the relative error target of {!r} covers all mesh bins, including sodium and reflector; '
+                          'trigger on the fuel pin tallies instead'.format(name))
+        trigger = openmc.Trigger('rel_err', rel_err)
+        trigger.scores = tally_planner.scores_of(tally, name)
+        tally.triggers = list(tally.triggers) + [trigger]
+
+    model.settings.batches = first_batch if first_batch is not None else model.settings.inactive + trigger_first_active
+    model.settings.trigger_active = True
+    model.settings.trigger_max_batches = max_batches
+    model.settings.trigger_batch_interval = interval
+    return model
+
+def histories_report(statepoint, fixed_batches=100):
+    """batches and histories of a triggered run, against the fixed schedule of fixed_batches"""
+    import h5py
+
+    with h5py.File(statepoint, 'r') as f:
+        particles = int(f['n_particles'][()])
+        batches = int(f['current_batch'][()])
+        k, k_std = f['k_combined'][()]
+
+    histories, fixed = batches * particles, fixed_batches * particles
+    print('keff = {:.5f} +/- {:.0f} pcm after {} batches'.format(k, k_std * 1e5, batches))
+    print('{} histories against {} for {} batches, {:.0f}% saved'.format(
+          histories, fixed, fixed_batches, 100 * (fixed - histories) / fixed))
+    return {'batches': batches, 'histories': histories, 'fixed histories': fixed, 'keff': k, 'std': k_std}
 
-# Instantiate neutron flux tally with en energy filter
-tally_nf = openmc.Tally(name="Neutron flux")
-tally_nf.filters = [mesh_filter]
-tally_nf.scores = ['flux']
-tallies_file.append(tally_nf)
-
-tally_pn = openmc.Tally(name="prompt n")
-tally_pn.filters = [mesh_filter]
-tally_pn.scores = ['prompt-nu-fission']
-tallies_file.append(tally_pn)
-
-tallies_file.export_to_xml()
-"""
-openmc.run()
-
-########### DEPLETION ############################
-
-
-"""
-themodel = openmc.model.Model()
-themodel.geometry = geometry
-themodel.settings = settings
-themodel.materials = materials_file 
-
-# ENDF/B-VII.1 Chain (Fast Spectrum)
-path = '/Volumes/T7/nndc/chain_endfb71_sfr.xml'
-chain = openmc.deplete.Chain.from_xml(path)
-operator = openmc.deplete.CoupledOperator(themodel, path)
-
-#power = 1200e6 # W 
-
-# ESFR made to be 3600 MWth
-power = 3600e6 # W 
-
-
-# six months with time step of a month
-time_steps = [30*24*60*60] * 6
-integrator = openmc.deplete.PredictorIntegrator(operator, time_steps, power)
 
 if __name__ == '__main__':
-    integrator.integrate()
+    # skips the run if this exact model has been run before
+    model = build_model()
+    cached_run(model, copy_to='.')
 
-"""
+    # stopping on target uncertainties instead of a fixed number of batches:
+    #model = add_triggers(build_model(tallies='lattice'), keff_pcm=20, tally_rel_err={'pins inner fuel': 0.05})
+    #histories_report(cached_run(model, copy_to='.'))
 
+########### DEPLETION ############################
 
+# see depletion_esfr.py, checkpointed and resumable after every step
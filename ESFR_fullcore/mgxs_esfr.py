@@ -0,0 +1,230 @@
+import copy
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+
+import openmc
+import openmc.mgxs
+
+import matter_esfr as matter
+from structure_esfr import build_core, core_params, default_params, fuels, assembly_lattice
+from main_esfr import build_model
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+import simplify_geometry
+import deduplicate_geometry
+
+"""
+Multigroup cross sections from a continuous energy reference run, and multigroup runs of
+ESFR variants.
+
+generate_library() runs the reference model once in continuous energy with the tallies of
+an openmc.mgxs.Library on the material cells of every pin type (inner and outer fuel, radial
+reflector, sodium, follower and control rod pins), the sodium around the assemblies and the
+axial reflectors, and writes the macroscopic cross sections of each to an MGXS library.
+Cells are identified by pin type and cell name (see cell_keys), not by id, so the library
+also applies to variants where e.g. the control rod cells are rebuilt.
+
+mg_model() builds a variant in multi-group mode with these cross sections. Density changes
+(sodium voiding, fuel density) are applied as 'macro' density factors; a changed fuel vector
+cannot be represented by macroscopic cross sections of the reference fuel, so every fuel
+vector gets its own library, at library_path(). compare() runs variants in both modes and
+reports keff and runtime, so the multigroup mode is only trusted where it reproduces the
+continuous energy keff. Both modes run the geometry simplified and deduplicated as in
+build_model, so the runtimes compare like with like.
+"""
+
+# 8 groups (eV), fine in the fast range
+group_edges = [1e-5, 1e2, 1e3, 1e4, 1e5, 5e5, 1e6, 2.5e6, 2e7]
+
+mgxs_types = ['total', 'absorption', 'nu-fission', 'fission', 'nu-scatter matrix', 'multiplicity matrix', 'chi']
+
+# variants: core_params changes and density factors of materials (by name in matter_esfr)
+variants = {'reference':       {},
+            'rods 10 cm':      {'params': {'crod_insertion_length': 10}},
+            'rods 60 cm':      {'params': {'crod_insertion_length': 60}},
+            'sodium voided':   {'density': {'sodium': 0.01}},
+            'fuel density +5%': {'density': {'inner_fuel': 1.05, 'outer_fuel': 1.05}},
+            'inner fuel only': {'params': {'outer_fuel': matter.inner_fuel}}}
+
+def cell_keys(core):
+    """{cell: key} of the material cells of a build_core dict, key = '<pin or region> <cell>'"""
+    keys = {}
+
+    def add(label, universe):
+        for cell in universe.cells.values():
+            if isinstance(cell.fill, openmc.Material):
+                keys[cell] = '{} {}'.format(label, cell.name or cell.fill.name)
+
+    for name, pin in core['pins'].items():
+        add(name, pin)
+    for name, FA_uni in core['assemblies'].items():
+        add(name + ' sodium', assembly_lattice(FA_uni).outer)
+    add('core sodium', core['core_lat'].outer)
+    add('core', core['geometry'].root_universe)
+    return keys
+
+def _factors(density):
+    """{material id: density factor} of density = {name in matter_esfr: factor}"""
+    return {getattr(matter, name).id: factor for name, factor in (density or {}).items()}
+
+def _prepared(geometry):
+    """geometry simplified and deduplicated as by build_model"""
+    geometry, removed = simplify_geometry.simplify(geometry)
+    geometry, merged = deduplicate_geometry.deduplicate(geometry)
+    return geometry
+
+def fuel_key(params=None):
+    """'reference' for the fuels of matter_esfr, else a hash of the compositions of the fuels of params"""
+    p = default_params if params is None else params
+    if p['inner_fuel'] is None and p['outer_fuel'] is None:
+        return 'reference'
+    sha = hashlib.sha256()
+    for fuel in fuels(p):
+        sha.update(repr((fuel.density, fuel.density_units, sorted((n.name, n.percent, n.percent_type)
+                                                                  for n in fuel.nuclides))).encode())
+    return sha.hexdigest()[:12]
+
+def library_path(directory='mgxs', params=None):
+    """MGXS library of the fuels of params in directory: mgxs.h5 for the reference fuels"""
+    key = fuel_key(params)
+    return os.path.abspath(os.path.join(directory, 'mgxs.h5' if key == 'reference' else 'mgxs_{}.h5'.format(key)))
+
+def generate_library(directory='mgxs', params=None, particles=10000, batches=100, inactive=10):
+    """
+    continuous energy run of the core for params with MGXS tallies, returns the path of the MGXS
+    library, library_path(directory, params)
+    """
+    p = default_params if params is None else params
+
+    # the cells of build_core are the library domains, so the geometry is kept as it is
+    model = build_model(p, particles=particles, batches=batches, inactive=inactive, simplify=False, deduplicate=False)
+    core = build_core(p)
+    keys = cell_keys(core)
+
+    library = openmc.mgxs.Library(model.geometry)
+    library.energy_groups = openmc.mgxs.EnergyGroups(group_edges)
+    library.mgxs_types = mgxs_types
+    library.domain_type = 'cell'
+    library.domains = list(keys)
+    library.by_nuclide = False
+    library.check_library_for_openmc_mgxs()
+    library.build_library()
+
+    model.tallies = openmc.Tallies()
+    library.add_to_tallies_file(model.tallies, merge=True)
+
+    os.makedirs(directory, exist_ok=True)
+    sp_path = model.run(cwd=directory, output=False)
+
+    with openmc.StatePoint(sp_path) as sp:
+        library.load_from_statepoint(sp)
+    mgxs_file = library.create_mg_library(xs_type='macro', xsdata_names=[keys[cell] for cell in library.domains])
+    path = library_path(directory, p)
+    mgxs_file.export_to_hdf5(path)
+    return path
+
+def mg_model(library, params=None, density=None, particles=10000, batches=100, inactive=10):
+    """
+    multi-group model of the variant params, density = {material name in matter_esfr: factor},
+    with the library generated for the fuels of params
+    """
+    p = default_params if params is None else params
+    model = build_model(p, particles=particles, batches=batches, inactive=inactive)
+
+    # a copy of the geometry, the cells of the continuous energy model are shared by the caches
+    core = copy.deepcopy(build_core(p))
+    factors = _factors(density)
+
+    materials = {}
+    for cell, key in cell_keys(core).items():
+        factor = factors.get(cell.fill.id, 1.)
+        if (key, factor) not in materials:
+            material = openmc.Material(name=key)
+            material.set_density('macro', factor)
+            material.add_macroscopic(key)
+            materials[key, factor] = material
+        cell.fill = materials[key, factor]
+
+    model.geometry = _prepared(core['geometry'])
+    model.materials = openmc.Materials(materials.values())
+    model.materials.cross_sections = library
+    model.settings.energy_mode = 'multi-group'
+    return model
+
+def ce_model(params=None, density=None, particles=10000, batches=100, inactive=10):
+    """continuous energy model of the variant, with density factors on clones of the materials"""
+    p = default_params if params is None else params
+    model = build_model(p, particles=particles, batches=batches, inactive=inactive)
+    if not density:
+        return model
+
+    core = copy.deepcopy(build_core(p))
+    factors = _factors(density)
+    clones = {}
+    for cell in cell_keys(core):
+        factor = factors.get(cell.fill.id)
+        if factor is not None:
+            if cell.fill.id not in clones:
+                clone = cell.fill.clone()
+                clone.set_density('g/cm3', cell.fill.get_mass_density() * factor)
+                clones[cell.fill.id] = clone
+            cell.fill = clones[cell.fill.id]
+
+    model.geometry = _prepared(core['geometry'])
+    model.materials = openmc.Materials(model.geometry.get_all_materials().values())
+    return model
+
+def _run(model, directory):
+    """keff, its std and the total runtime (s) of a run of model in directory"""
+    start = time.perf_counter()
+    sp_path = model.run(cwd=directory, output=False)
+    wall = time.perf_counter() - start
+    with openmc.StatePoint(sp_path) as sp:
+        keff = sp.keff
+    return keff.nominal_value, keff.std_dev, wall
+
+def compare(library=None, variants=variants, directory='mgxs', tolerance=300e-5, **run_args):
+    """
+    Run every variant in continuous energy and multi-group mode, print and return the keff and
+    runtime of both. A variant is marked trusted when the multi-group keff is within tolerance
+    (and 2 std) of the continuous energy keff.
+
+    library is the MGXS library of the reference fuels, generated if None; the libraries of
+    variants with other fuels are generated, once per fuel vector.
+    """
+    libraries = {} if library is None else {'reference': library}
+
+    report = []
+    for name, variant in variants.items():
+        params = core_params(**variant.get('params', {}))
+        density = variant.get('density')
+        workdir = os.path.join(directory, name.replace(' ', '_'))
+        key = fuel_key(params)
+        if key not in libraries:
+            libraries[key] = generate_library(directory, params, **run_args)
+        library = libraries[key]
+
+        k_ce, std_ce, t_ce = _run(ce_model(params, density, **run_args), os.path.join(workdir, 'ce'))
+        k_mg, std_mg, t_mg = _run(mg_model(library, params, density, **run_args), os.path.join(workdir, 'mg'))
+
+        difference = k_mg - k_ce
+        trusted = abs(difference) <= max(tolerance, 2 * np.hypot(std_ce, std_mg))
+        report.append({'variant': name, 'keff ce': k_ce, 'std ce': std_ce, 'keff mg': k_mg, 'std mg': std_mg,
+                       'difference': difference, 'runtime ce': t_ce, 'runtime mg': t_mg, 'trusted': trusted})
+
+    print('{:18s} {:>16s} {:>16s} {:>9s} {:>9s} {:>9s} {:>8s}'.format(
+          'variant', 'keff CE', 'keff MG', 'MG-CE', 'time CE', 'time MG', 'speedup'))
+    for row in report:
+        print('{:18s} {:8.5f}+/-{:5.0f} {:8.5f}+/-{:5.0f} {:+7.0f}pcm {:8.0f}s {:8.0f}s {:7.1f}x {}'.format(
+              row['variant'], row['keff ce'], row['std ce'] * 1e5, row['keff mg'], row['std mg'] * 1e5,
+              row['difference'] * 1e5, row['runtime ce'], row['runtime mg'], row['runtime ce'] / row['runtime mg'],
+              '' if row['trusted'] else '  MG NOT TRUSTED'))
+    return report
+
+
+if __name__ == '__main__':
+    compare()
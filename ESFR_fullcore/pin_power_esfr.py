@@ -0,0 +1,138 @@
+import numpy as np
+
+import statepoint_reader
+import tally_archive
+from structure_esfr import build_core, default_params, ring_positions, assembly_lattice
+from lattice_tallies import tally_positions, lattice_tally_requests, ring_index
+
+"""
+Pin powers and peaking factors of the ESFR.
+
+pin_power_requests() tallies fission and kappa-fission (recoverable fission energy) per fuel
+pin with the distribcell tallies of lattice_tallies.py, in all inner and outer fuel, CSD and
+DSD assemblies. pin_powers() reads them back into a compact float32 array indexed by
+(assembly, pin): the rows are the fuel assemblies in core_uni_grid order, the columns the
+271 pin positions of standardFA/crod_array in ring order, NaN where the position holds no
+fuel (control rods, followers).
+
+peaking_factors() then computes, vectorized over the whole array at once, the relative pin
+and assembly powers, the radial peaking factor (hottest assembly over the mean assembly),
+the local peaking factor of every assembly (hottest pin over the mean pin of the assembly)
+and the pin peaking factor (hottest pin over the mean pin of the core), with uncertainties
+from the tally standard deviations. Bins are treated as independent, the covariance between
+the pins of a batch is not in the statepoint.
+
+The tallies are of the full core; in a sector model (sector_esfr.py) the pins outside the
+sector have no power.
+"""
+
+scores = ['fission', 'kappa-fission']
+
+def pin_power_requests(geometry, params=None, scores=scores):
+    """(name, filters, scores) of the fuel pin tallies, see tally_planner.py"""
+    return [request for request in lattice_tally_requests(geometry, params, scores) if request[0].startswith('pins ')]
+
+def pin_powers(path, params=None, score='kappa-fission'):
+    """
+    Pin powers of the statepoint or tally archive path, as a dict with 'power' and 'std' of
+    shape (fuel assemblies, 271), the 'assemblies' (index in core_uni_grid order of every
+    row), the assembly centers 'xy' and the pin offsets 'pin_xy' in the assembly
+    """
+    p = default_params if params is None else params
+    core = build_core(p)
+    read_tally = tally_archive.read_tally if tally_archive.is_archive(path) else statepoint_reader.read_tally
+
+    positions = tally_positions(p)
+    names = [name for name in positions if name.startswith('pins ')]
+    xy = np.concatenate([positions[name] for name in names])
+    mean = np.concatenate([np.ravel(read_tally(path, name=name, score=score)) for name in names])
+    rel_err = np.concatenate([np.ravel(read_tally(path, name=name, score=score, statistic='rel_err')) for name in names])
+
+    # (assembly, pin) of every tally bin from its position
+    n_rings, pitch = len(core['core_uni_grid']), p['lattice_pitch']
+    centers = np.concatenate(ring_positions(n_rings, pitch, 'y'))
+    assembly = ring_index(xy, pitch, 'y', n_rings)
+    pin_lattice = assembly_lattice(core['assemblies']['iFA'])
+    pin_rings, pin_pitch = len(pin_lattice.universes), pin_lattice.pitch[0]
+    pin = ring_index(xy - centers[assembly], pin_pitch, 'x', pin_rings)
+    if (assembly < 0).any() or (pin < 0).any():
+        raise ValueError('fuel pins outside the core or assembly lattice')
+
+    assemblies = np.unique(assembly)
+    row = np.searchsorted(assemblies, assembly)
+    n_pins = 3 * pin_rings * (pin_rings - 1) + 1
+    power = np.full((len(assemblies), n_pins), np.nan, dtype=np.float32)
+    std = np.full((len(assemblies), n_pins), np.nan, dtype=np.float32)
+    power[row, pin] = mean
+    std[row, pin] = rel_err * np.abs(mean)
+
+    return {'power': power,
+            'std': std,
+            'assemblies': assemblies,
+            'xy': centers[assemblies],
+            'pin_xy': np.concatenate(ring_positions(pin_rings, pin_pitch, 'x'))}
+
+def save_pin_powers(result, path):
+    np.savez_compressed(path, **result)
+
+def load_pin_powers(path):
+    with np.load(path) as f:
+        return {name: f[name] for name in f.files}
+
+def peaking_factors(result, total_power=None):
+    """
+    Relative pin and assembly powers and peaking factors of a pin_powers() result, each
+    with its standard deviation ('... std'); the assembly powers in W too if total_power (W)
+    """
+    power = result['power'].astype(float)
+    var = result['std'].astype(float)**2
+    fuel = ~np.isnan(power)
+    n_fuel = fuel.sum()
+
+    total = np.nansum(power)
+    rel_total = np.sqrt(np.nansum(var)) / total
+
+    # pins relative to the mean pin of the core
+    pin = power * n_fuel / total
+    pin_std = pin * np.sqrt(var / power**2 + rel_total**2)
+
+    # assemblies relative to the mean assembly
+    n_pins = fuel.sum(axis=1)
+    assembly_sum = np.nansum(power, axis=1)
+    assembly_rel = np.sqrt(np.nansum(var, axis=1)) / assembly_sum
+    assembly = assembly_sum * len(assembly_sum) / total
+    assembly_std = assembly * np.sqrt(assembly_rel**2 + rel_total**2)
+
+    # hottest pin of every assembly against the mean pin of the assembly
+    hot = np.nanargmax(power, axis=1)
+    rows = np.arange(len(power))
+    local = power[rows, hot] * n_pins / assembly_sum
+    local_std = local * np.sqrt(var[rows, hot] / power[rows, hot]**2 + assembly_rel**2)
+
+    radial = np.argmax(assembly)
+    hottest = np.unravel_index(np.nanargmax(pin), pin.shape)
+    factors = {'pin power': pin, 'pin power std': pin_std,
+               'assembly power': assembly, 'assembly power std': assembly_std,
+               'local peaking': local, 'local peaking std': local_std,
+               'radial peaking': assembly[radial], 'radial peaking std': assembly_std[radial],
+               'hottest assembly': result['assemblies'][radial],
+               'pin peaking': pin[hottest], 'pin peaking std': pin_std[hottest],
+               'hottest pin': (result['assemblies'][hottest[0]], hottest[1])}
+    if total_power is not None:
+        factors['assembly power W'] = assembly_sum / total * total_power
+    return factors
+
+def print_report(factors):
+    print('radial peaking factor {:.4f} +/- {:.4f} (assembly {})'.format(
+          factors['radial peaking'], factors['radial peaking std'], factors['hottest assembly']))
+    i = np.argmax(factors['local peaking'])
+    print('local peaking factor {:.4f} +/- {:.4f} (max), {:.4f} (mean over assemblies)'.format(
+          factors['local peaking'][i], factors['local peaking std'][i], factors['local peaking'].mean()))
+    print('pin peaking factor {:.4f} +/- {:.4f} (assembly {}, pin {})'.format(
+          factors['pin peaking'], factors['pin peaking std'], *factors['hottest pin']))
+
+
+if __name__ == '__main__':
+    result = pin_powers('statepoint.100.h5')
+    save_pin_powers(result, 'pin_powers.npz')
+    print_report(peaking_factors(result, total_power=3600e6))
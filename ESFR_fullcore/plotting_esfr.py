@@ -1,35 +1,42 @@
-import matplotlib.pyplot as plt 
 import openmc
-import numpy as np 
 
-from structure_esfr import geometry
-from matter_esfr import inner_fuel, outer_fuel, sodium, clad_mat
+from structure_esfr import build_core
+import matter_esfr as matter
 
-colordef = {inner_fuel: 'yellow', 
-			outer_fuel: 'green', 
-			sodium: 'red', 
-			clad_mat: 'grey', }
-"""
-plot_xy = openmc.Plot.from_geometry(geometry)
-plot_xy.color_by = 'material'
-plot_xy.basis = 'xy'
-plot_xy.origin = (0,0,0)
+def plot_geometry(params=None):
+    """xy and xz material plots of the core, made with openmc in plotting mode"""
+    geometry = build_core(params)['geometry']
 
-plot_xy.pixels = [800,800]
-plot_xy.colors = colordef
+    colordef = {matter.inner_fuel: 'yellow',
+                matter.outer_fuel: 'green',
+                matter.sodium: 'red',
+                matter.clad_mat: 'grey', }
 
-plot_xz = openmc.Plot.from_geometry(geometry)
-plot_xz.color_by = 'material'
-plot_xz.basis = 'xz'
+    plot_xy = openmc.Plot.from_geometry(geometry)
+    plot_xy.color_by = 'material'
+    plot_xy.basis = 'xy'
+    plot_xy.origin = (0,0,0)
 
-plot_xz.pixels = [1000,1000]
-plot_xz.colors = colordef
+    plot_xy.pixels = [800,800]
+    plot_xy.colors = colordef
 
+    plot_xz = openmc.Plot.from_geometry(geometry)
+    plot_xz.color_by = 'material'
+    plot_xz.basis = 'xz'
 
-plots = openmc.Plots([plot_xy, plot_xz])
-"""
+    plot_xz.pixels = [1000,1000]
+    plot_xz.colors = colordef
 
 
-plots.export_to_xml()
+    plots = openmc.Plots([plot_xy, plot_xz])
+    plots.export_to_xml()
 
-openmc.plot_geometry()
\ No newline at end of file
+    # plotting mode also needs the model
+    geometry.export_to_xml()
+    openmc.Materials(list(colordef) + [matter.EM10, matter.follower, matter.boron_carbide]).export_to_xml()
+
+    openmc.plot_geometry()
+
+
+if __name__ == '__main__':
+    plot_geometry()
@@ -0,0 +1,97 @@
+"""
+Criticality search on the control rod insertion length.
+
+Instead of hand-editing crod_insertion_length and re-running main_esfr.py with full
+statistics, the insertion is found by regula falsi iterations (common/staged_search.py),
+where the early iterations use cheap statistics and only the iterations close to the root
+get the full precision of main_esfr.py. Every run after the first starts from the source
+bank of the run with the nearest insertion, with fewer inactive batches (see warm_start.py).
+"""
+
+import os
+import sys
+
+import openmc
+
+from structure_esfr import core_params, FA_height
+from main_esfr import build_model
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from run_cache import cached_run
+from warm_start import write_source, warm_start, nearest
+from staged_search import regula_falsi
+
+# (particles, batches, inactive) from the cheapest to the full precision run of main_esfr.py
+stages = [(1000, 40, 10),
+          (3000, 60, 10),
+          (10000, 100, 10)]
+
+def run_keff(params, stage, source=None, directory='crod_search'):
+    """
+    run the model for params with the statistics of stage, starting from the source file
+    source if given, return (keff, std, histories, source file of the final source bank)
+    """
+    particles, batches, inactive = stage
+
+    # points already computed by an earlier search are taken from the run cache
+    model = build_model(params, particles=particles, batches=batches, inactive=inactive)
+    warm_start(model.settings, source)
+    sp_path = cached_run(model, output=False)
+
+    with openmc.StatePoint(sp_path) as sp:
+        keff = sp.keff
+
+    return keff.nominal_value, keff.std_dev, particles * model.settings.batches, write_source(sp_path, directory)
+
+def crod_search(bracket=(0., FA_height), target=1.0, tol=100e-5, stages=stages, max_iter=15, run=run_keff,
+                warm=True):
+    """
+    Find the control rod insertion length (cm) giving keff = target.
+
+    Regula falsi iterations (Illinois variant) are done on the insertion length within
+    bracket. The search starts with the cheapest statistics in stages and moves to the next
+    stage once keff is within max(tol, 2 std) of target, i.e. when the current statistics
+    can no longer tell on which side of the root we are. The search has converged when a
+    run with the last stage is within max(tol, 2 std) of target. With warm, runs start from
+    the source of the nearest insertion run so far.
+
+    Returns a dict with the 'insertion', its 'keff' and 'std', the total number of
+    'histories' spent and the 'history' of all runs.
+    """
+    history = []
+    sources = {}
+
+    def evaluate(x, stage):
+        particles, batches, inactive = stages[stage]
+        keff, std, histories, source = run(core_params(crod_insertion_length=x), stages[stage],
+                                           source=nearest(sources, x) if warm else None)
+        sources[x] = source
+        batches = histories // particles
+
+        history.append({'insertion': x, 'keff': keff, 'std': std, 'histories': histories, 'stage': stage})
+        print('{:3d}   insertion = {:7.3f} cm   keff = {:.5f} +/- {:.5f}   ({} particles x {} batches)'.format(
+              len(history), x, keff, std, particles, batches))
+        return keff - target, std
+
+    x, converged = regula_falsi(evaluate, bracket, len(stages), tol, max_iter)
+    if not converged:
+        print('crod_search: no convergence after {} iterations'.format(max_iter))
+
+    last = history[-1]
+    return {'insertion': last['insertion'],
+            'keff': last['keff'],
+            'std': last['std'],
+            'histories': sum(run['histories'] for run in history),
+            'converged': converged,
+            'history': history}
+
+
+if __name__ == '__main__':
+    result = crod_search()
+
+    particles, batches, inactive = stages[-1]
+    print()
+    print('control rod insertion for criticality: {:.3f} cm'.format(result['insertion']))
+    print('keff = {:.5f} +/- {:.5f}'.format(result['keff'], result['std']))
+    print('total histories: {} (= {:.1f} full precision runs)'.format(
+          result['histories'], result['histories'] / (particles * batches)))
@@ -0,0 +1,124 @@
+import numpy as np
+
+import openmc
+
+from structure_esfr import build_core, default_params, assembly_lattice
+
+"""
+Rotational symmetry sector of the ESFR core.
+
+The rings of core_uni_grid and of the assembly lattices are built from patterns repeated
+around the ring, so a rotation of the core by 360/sectors degrees maps it onto itself when
+every ring repeats after a shift by 1/sectors of its length. symmetry_breaks() checks this
+on the lattices as they are built: for the default core all rings are symmetric under 120
+degrees, while the DSD positions of ring7 (nine DSD, every fourth assembly) break the 60
+degree symmetry.
+
+sector_geometry() cuts the root cells of the full core to the sector between two planes
+through the z axis, with rotational periodic boundary conditions, so the lattices and
+universes are the same objects as in the full core. A sector run needs its source sites
+in the sector: sample_sites() in source_esfr.py folds the fuel pin sites into it.
+
+Mesh tallies of a sector run only score inside the sector. unfold() rotates every bin of a
+full core map onto the sector and takes the value there, divided by sectors since all
+source particles of the sector run are in one sector of the core.
+"""
+
+# angle (degrees) of the first plane of the sector, the second is 360/sectors further
+start_angle = 90.
+
+def symmetry_breaks(core, sectors):
+    """
+    rings of core_lat and the assembly lattices of a build_core dict that do not repeat after
+    a rotation by 360/sectors degrees, as a list of dicts with the 'lattice' name, the 'ring'
+    number (1 = center, as the ring names of structure_esfr.py) and the 'positions' in the
+    ring whose universe differs from the one rotated onto it
+    """
+    lattices = [core['core_lat']] + [assembly_lattice(FA_uni) for FA_uni in core['assemblies'].values()]
+    breaks = []
+    for lattice in lattices:
+        for i, ring in enumerate(lattice.universes):
+            ids = np.array([uni.id for uni in ring])
+            positions = np.flatnonzero(ids != np.roll(ids, -(len(ids) // sectors)))
+            if len(positions):
+                breaks.append({'lattice': lattice.name, 'ring': len(lattice.universes) - i, 'positions': positions})
+    return breaks
+
+def sector_planes(sectors, start=start_angle):
+    """
+    the two periodic planes through the z axis at start and start + 360/sectors degrees,
+    with their normals pointing into the sector (as OpenMC expects for rotational periodic
+    boundaries), so the sector is +first & +second
+    """
+    if sectors not in (3, 6):
+        raise ValueError('only 1/3 and 1/6 sectors of the core are supported')
+    a0, a1 = np.radians(start), np.radians(start + 360. / sectors)
+    first = openmc.Plane(a=-np.sin(a0), b=np.cos(a0), c=0., d=0., boundary_type='periodic')
+    second = openmc.Plane(a=np.sin(a1), b=-np.cos(a1), c=0., d=0., boundary_type='periodic')
+    first.periodic_surface = second
+    return first, second
+
+def sector_geometry(core, sectors, start=start_angle):
+    """geometry of a 1/sectors sector of the core (a build_core dict), ValueError if it is not symmetric"""
+    breaks = symmetry_breaks(core, sectors)
+    if breaks:
+        raise ValueError('the core is not symmetric under a rotation by {:.0f} degrees: {}'.format(
+                         360. / sectors, '; '.join('{} ring {} at positions {}'.format(b['lattice'], b['ring'], list(b['positions']))
+                                                   for b in breaks)))
+
+    first, second = sector_planes(sectors, start)
+    sector = +first & +second
+    cells = [openmc.Cell(name=cell.name, fill=cell.fill, region=cell.region & sector)
+             for cell in core['geometry'].root_universe.cells.values()]
+    return openmc.Geometry(openmc.Universe(cells=cells))
+
+def symmetric_sectors(params=None):
+    """the sectors (3, 6) that the core for params is symmetric for"""
+    core = build_core(default_params if params is None else params)
+    return [sectors for sectors in (3, 6) if not symmetry_breaks(core, sectors)]
+
+def fold(x, y, sectors, start=start_angle):
+    """points (x, y) rotated into the sector by multiples of 360/sectors degrees, and the rotation angles (rad)"""
+    alpha = 2 * np.pi / sectors
+    angle = -np.floor((np.arctan2(y, x) - np.radians(start)) / alpha) * alpha
+    cos, sin = np.cos(angle), np.sin(angle)
+    return cos * x - sin * y, sin * x + cos * y, angle
+
+def unfold(values, extent, sectors, start=start_angle, window=None):
+    """
+    full core map of a mesh tally map values (ny, nx) over extent = (x0, x1, y0, y1) from a
+    sector run, over window = (x0, x1, y0, y1) in cm if given; returns the map and its extent
+    """
+    ny, nx = values.shape
+    x0, x1, y0, y1 = extent
+    dx, dy = (x1 - x0) / nx, (y1 - y0) / ny
+
+    i0, i1, j0, j1 = 0, nx, 0, ny
+    if window is not None:
+        i0, i1 = np.clip([np.floor((window[0] - x0) / dx), np.ceil((window[1] - x0) / dx)], 0, nx).astype(int)
+        j0, j1 = np.clip([np.floor((window[2] - y0) / dy), np.ceil((window[3] - y0) / dy)], 0, ny).astype(int)
+
+    x, y = np.meshgrid(x0 + (np.arange(i0, i1) + 0.5) * dx, y0 + (np.arange(j0, j1) + 0.5) * dy)
+    x, y, _ = fold(x, y, sectors, start)
+
+    # bins cut by the sector planes are only partly scored, so the points are kept half a
+    # bin diagonal inside the sector
+    r = np.hypot(x, y)
+    alpha = 2 * np.pi / sectors
+    margin = np.arcsin(np.minimum(1., np.hypot(dx, dy) / 2 / np.maximum(r, 1e-12)))
+    theta = np.clip(np.mod(np.arctan2(y, x) - np.radians(start), 2 * np.pi), np.minimum(margin, alpha / 2),
+                    np.maximum(alpha - margin, alpha / 2)) + np.radians(start)
+    x, y = r * np.cos(theta), r * np.sin(theta)
+
+    i =np.clip(np.floor((x - x0) / dx).astype(int), 0, nx - 1)
+    j = np.clip(np.floor((y - y0) / dy).astype(int), 0, ny - 1)
+    return values[j, i] / sectors, (x0 + i0 * dx, x0 + i1 * dx, y0 + j0 * dy, y0 + j1 * dy)
+
+
+if __name__ == '__main__':
+    core = build_core(default_params)
+    for sectors in (3, 6):
+        breaks = symmetry_breaks(core, sectors)
+        print('1/{} sector: {}'.format(sectors, 'symmetric' if not breaks else ''))
+        for b in breaks:
+            print('    {} ring {} breaks the symmetry at positions {}'.format(b['lattice'], b['ring'], list(b['positions'])))
@@ -0,0 +1,129 @@
+import os
+import hashlib
+
+import numpy as np
+
+from structure_esfr import build_core, default_params, lattice_positions, assembly_lattice
+
+"""
+Initial fission source sampled directly in the fuel pins of the ESFR.
+
+The uniform box source of main_esfr.py (760 x 760 x 100 cm, only_fissionable=True) rejects
+most of its samples, since most of the box is reflector, sodium or outside the core. Here
+the fuel pin positions are read from core_lat (the inner and outer fuel pins of the iFA,
+oFA, CSD and DSD assemblies), source sites are sampled uniformly inside the fuel pellets
+of randomly chosen pins, optionally with a radial and axial cosine shape, and written to a
+source file, so no sample is ever rejected.
+"""
+
+def fuel_pin_positions(core, assemblies=False):
+    """
+    (x, y) centers of all fuel pins of the core (a build_core dict), array of shape (n, 2),
+    and the index of the assembly of each pin (in the order of core_uni_grid) if assemblies
+    """
+    fuel_ids = {core['pins']['inner fuel'].id, core['pins']['outer fuel'].id}
+
+    # pin offsets of the fuel pins in each assembly type
+    offsets = {}
+    for FA_uni in core['assemblies'].values():
+        lattice = assembly_lattice(FA_uni)
+        offsets[FA_uni.id] = np.concatenate([xy[[uni.id in fuel_ids for uni in ring]]
+                                             for ring, xy in zip(lattice.universes, lattice_positions(lattice))])
+
+    centers, index = [], []
+    FA_unis = [FA_uni for ring in core['core_uni_grid'] for FA_uni in ring]
+    for i, (FA_uni, center) in enumerate(zip(FA_unis, np.concatenate(lattice_positions(core['core_lat'])))):
+        if len(offsets[FA_uni.id]):
+            centers.append(center + offsets[FA_uni.id])
+            index.append(np.full(len(offsets[FA_uni.id]), i))
+    if assemblies:
+        return np.concatenate(centers), np.concatenate(index)
+    return np.concatenate(centers)
+
+def watt_energies(n, rng, a=0.988e6, b=2.249e-6):
+    """n energies (eV) from the Watt fission spectrum of OpenMC's default source"""
+    u1, u2, u3, u4 = rng.random((4, n))
+    x = -a * (np.log(u1) + np.log(u2) * np.cos(np.pi * u3 / 2)**2)
+    return x + a**2 * b / 4 + (2 * u4 - 1) * np.sqrt(a**2 * b * x)
+
+def sample_sites(n, params=None, cosine=False, extrapolation=1.1, seed=1, power=None, sectors=None):
+    """
+    n source sites (positions (n, 3), directions (n, 3), energies (n,)) in the fuel pins.
+
+    Pins are chosen uniformly, or with weight cos(pi/2 r / (extrapolation R)) on their
+    distance r from the core axis if cosine (R the radius of the outermost fuel pin), and
+    z is uniform or cos(pi z / (extrapolation FA_height)) distributed over the fuel height.
+
+    power is a diffusion_esfr.solve() result instead: nodes (assembly, layer) are chosen by
+    their power, then a pin of the assembly and z in the layer uniformly.
+
+    With sectors, the sites are rotated into the sector model of sector_esfr.py.
+    """
+    p = default_params if params is None else params
+    rng = np.random.default_rng(seed)
+    core = build_core(p)
+    pins, assembly = fuel_pin_positions(core, assemblies=True)
+
+    # pins, and points uniformly distributed in the fuel pellet of each
+    if power is not None:
+        node = rng.choice(power['power'].size, size=n, p=(power['power'] / power['power'].sum()).ravel())
+        a, layer = np.divmod(node, power['power'].shape[1])
+        first = np.searchsorted(assembly, a)
+        count = np.searchsorted(assembly, a, side='right') - first
+        chosen = first + (rng.random(n) * count).astype(int)
+    elif cosine:
+        r = np.hypot(pins[:, 0], pins[:, 1])
+        weight = np.cos(np.pi / 2 * r / (extrapolation * r.max()))
+        chosen = rng.choice(len(pins), size=n, p=weight / weight.sum())
+    else:
+        chosen = rng.integers(len(pins), size=n)
+    radius = p['fuel_outer_d'] / 2 * np.sqrt(rng.random(n))
+    phi = 2 * np.pi * rng.random(n)
+    xy = pins[chosen] + radius[:, None] * np.column_stack([np.cos(phi), np.sin(phi)])
+
+    height = p['FA_height']
+    if power is not None:
+        z0, z1 = power['z_edges'][layer], power['z_edges'][layer + 1]
+        z = z0 + (z1 - z0) * rng.random(n)
+    elif cosine:
+        # inverse of the cdf of cos(a z) on [-height/2, height/2]
+        a = np.pi / (extrapolation * height)
+        z = np.arcsin((2 * rng.random(n) - 1) * np.sin(a * height / 2)) / a
+    else:
+        z = height * (rng.random(n) - 0.5)
+
+    # isotropic directions
+    mu = 2 * rng.random(n) - 1
+    phi = 2 * np.pi * rng.random(n)
+    u = np.column_stack([np.sqrt(1 - mu**2) * np.cos(phi), np.sqrt(1 - mu**2) * np.sin(phi), mu])
+
+    if sectors:
+        from sector_esfr import fold
+
+        x, y, angle = fold(xy[:, 0], xy[:, 1], sectors)
+        xy = np.column_stack([x, y])
+        u[:, :2] = np.column_stack([np.cos(angle) * u[:, 0] - np.sin(angle) * u[:, 1],
+                                    np.sin(angle) * u[:, 0] + np.cos(angle) * u[:, 1]])
+
+    return np.column_stack([xy, z]), u, watt_energies(n, rng)
+
+def write_sites(positions, directions, energies, directory='sources', prefix='fuel_source'):
+    """source file of the sites in directory, named by its content; returns its absolute path"""
+    import openmc
+
+    digest = hashlib.sha256(b''.join(np.ascontiguousarray(a).tobytes()
+                                     for a in (positions, directions, energies))).hexdigest()[:16]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.abspath(os.path.join(directory, '{}_{}.h5'.format(prefix, digest)))
+    if not os.path.exists(path):
+        particles = [openmc.SourceParticle(r=tuple(r), u=tuple(u), E=E)
+                     for r, u, E in zip(positions, directions, energies)]
+        openmc.write_source_file(particles, path)
+    return path
+
+def fuel_source(n, params=None, cosine=False, power=None, directory='sources', sectors=None):
+    """openmc.Source from a file of n sites sampled in the fuel pins (see sample_sites)"""
+    import openmc
+
+    path = write_sites(*sample_sites(n, params, cosine, power=power, sectors=sectors), directory=directory)
+    return openmc.Source(filename=path)
@@ -0,0 +1,190 @@
+import numpy as np
+import h5py
+
+"""
+Windowed reader for the mesh tallies in a statepoint.
+
+openmc.StatePoint reads the whole results array of a tally (sum and sum of squares of every
+bin and score) before anything can be sliced. For the 1000x1000 ESFR mesh tallies this is
+millions of bins even when only one score in one corner of the core is needed. Here the
+results dataset is memory mapped (statepoints are written contiguous and uncompressed) or,
+if that is not possible, read in chunks of rows, so only the requested window of one score
+is ever read from disk.
+"""
+
+statistics = ('mean', 'std_dev', 'rel_err', 'sum', 'sum_sq')
+
+# separators in the name of a merged tally (see tally_planner.py), of the requested names and
+# of a requested name and its scores, e.g. 'Neutron flux: flux | prompt n: prompt-nu-fission'
+name_separator = ' | '
+score_separator = ': '
+
+def requested(tally_name):
+    """{requested name: its scores, None for all scores of the tally} of a tally name"""
+    requests = {}
+    for part in tally_name.split(name_separator):
+        name, separator, scores = part.partition(score_separator)
+        requests[name] = scores.split() if separator else None
+    return requests
+
+def requested_names(tally_name):
+    """the names a tally was requested as, several if tally_planner.py merged them"""
+    return list(requested(tally_name))
+
+def matches(tally_name, tally_scores, name=None, score=None):
+    """whether a tally with tally_scores was requested as name (any if None) with score (any if None)"""
+    requests = requested(tally_name)
+    if name is not None and name not in requests:
+        return False
+    if score is None:
+        return True
+    if score not in tally_scores:
+        return False
+    return name is None or requests[name] is None or score in requests[name]
+
+def read_text(dataset):
+    """a string dataset of a statepoint as str"""
+    value = dataset[()]
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+def find_tally(f, name=None, score=None):
+    """group of the first tally in the open statepoint f with the given name and/or score"""
+    for tally_id in f['tallies'].attrs['ids']:
+        group = f['tallies/tally {}'.format(tally_id)]
+        tally_name = read_text(group['name']) if 'name' in group else ''
+        if not matches(tally_name, [s.decode() for s in group['score_bins'][()]], name, score):
+            continue
+        return group
+    raise LookupError('no tally with name={!r} and score={!r}'.format(name, score))
+
+def tally_mesh(f, tally):
+    """dimension, lower left and width of the mesh of a tally with only a MeshFilter"""
+    filter_ids = tally['filters'][()] if tally['n_filters'][()] > 0 else []
+    if len(filter_ids) != 1:
+        raise ValueError('only tallies with a single MeshFilter can be read by window')
+
+    mesh_filter = f['tallies/filters/filter {}'.format(filter_ids[0])]
+    if read_text(mesh_filter['type']) != 'mesh':
+        raise ValueError('only tallies with a single MeshFilter can be read by window')
+
+    mesh = f['tallies/meshes/mesh {}'.format(mesh_filter['bins'][()][0])]
+    dimension = mesh['dimension'][()]
+    if np.prod(dimension[2:]) != 1:
+        raise ValueError('only 2D meshes can be read by window')
+    lower_left = mesh['lower_left'][()]
+    width = (mesh['upper_right'][()] - lower_left) / dimension
+    return dimension, lower_left, width
+
+def index_window(dimension, lower_left, width, window):
+    """index slices (y, x) of window = (x0, x1, y0, y1) in cm, the whole mesh if None"""
+    nx, ny = dimension[:2]
+    if window is None:
+        return slice(0, ny), slice(0, nx)
+
+    x0, x1, y0, y1 = window
+    i0, i1 = np.clip([np.floor((x0 - lower_left[0]) / width[0]), np.ceil((x1 - lower_left[0]) / width[0])], 0, nx)
+    j0, j1 = np.clip([np.floor((y0 - lower_left[1]) / width[1]), np.ceil((y1 - lower_left[1]) / width[1])], 0, ny)
+    return slice(int(j0), int(j1)), slice(int(i0), int(i1))
+
+def _read_window(path, results, nx, ny, rows, cols, column, max_bins):
+    """(sum, sum_sq) of one results column over the bins [rows, cols], shape (rows, cols, 2)"""
+    n_columns = results.shape[1]
+
+    offset = results.id.get_offset()
+    if results.chunks is None and results.compression is None and offset is not None:
+        data = np.memmap(path, dtype=results.dtype, mode='r', offset=offset, shape=(ny, nx, n_columns, 2))
+        return np.array(data[rows, cols, column, :])
+
+    # chunked reads of whole rows of the mesh, at most max_bins bins at a time
+    width = cols.stop - cols.start
+    out = np.empty((rows.stop - rows.start, width, 2), dtype=results.dtype)
+    n_rows = max(1, int(max_bins // nx))
+    for j in range(rows.start, rows.stop, n_rows):
+        j_end = min(j + n_rows, rows.stop)
+        if 2 * width > nx:
+            block = results[j*nx:j_end*nx, column, :].reshape(j_end - j, nx, 2)
+            out[j - rows.start:j_end - rows.start] = block[:, cols]
+        else:
+            for jj in range(j, j_end):
+                out[jj - rows.start] = results[jj*nx + cols.start:jj*nx + cols.stop, column, :]
+    return out
+
+def read_mesh_window(path, name=None, score='flux', statistic='mean', window=None, nuclide='total',
+                     max_bins=1000000):
+    """
+    One statistic of one score of a 2D mesh tally, for the bins inside window only.
+
+    The tally is found by name and/or score. statistic is one of 'mean', 'std_dev',
+    'rel_err', 'sum' and 'sum_sq'. window = (x0, x1, y0, y1) in cm selects the mesh bins
+    covering that rectangle, the whole mesh if None.
+
+    Returns the array of shape (ny, nx) of the window, indexed [y, x] like the reshaped
+    tally.mean in tally_processing.py, and the window extent (x0, x1, y0, y1) in cm of
+    the returned bins, e.g. for imshow.
+    """
+    if statistic not in statistics:
+        raise ValueError('statistic must be one of {}'.format(', '.join(statistics)))
+
+    with h5py.File(path, 'r') as f:
+        tally = find_tally(f, name, score)
+        dimension, lower_left, width = tally_mesh(f, tally)
+
+        scores = [s.decode() for s in tally['score_bins'][()]]
+        nuclides = [n.decode() for n in tally['nuclides'][()]]
+        column = nuclides.index(nuclide) * len(scores) + scores.index(score)
+        n = tally['n_realizations'][()]
+
+        rows, cols = index_window(dimension, lower_left, width, window)
+        results = tally['results']
+        data = _read_window(path, results, dimension[0], dimension[1], rows, cols, column, max_bins)
+
+    sum_, sum_sq = data[..., 0], data[..., 1]
+    if statistic == 'sum':
+        values = sum_
+    elif statistic == 'sum_sq':
+        values = sum_sq
+    else:
+        mean = sum_ / n
+        if statistic == 'mean':
+            values = mean
+        else:
+            std_dev = np.sqrt(np.maximum(sum_sq / n - mean**2, 0) / (n - 1))
+            if statistic == 'std_dev':
+                values = std_dev
+            else:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    values = np.where(mean != 0, std_dev / np.abs(mean), 0.)
+
+    extent = (lower_left[0] + cols.start * width[0], lower_left[0] + cols.stop * width[0],
+              lower_left[1] + rows.start * width[1], lower_left[1] + rows.stop * width[1])
+    return values, tuple(float(x) for x in extent)
+
+def read_tally(path, name=None, score='flux', statistic='mean', nuclide='total'):
+    """
+    One statistic of one score of a tally over all its filter bins, flattened, e.g. of the
+    distribcell tallies of lattice_tallies.py
+    """
+    if statistic not in statistics:
+        raise ValueError('statistic must be one of {}'.format(', '.join(statistics)))
+
+    with h5py.File(path, 'r') as f:
+        tally = find_tally(f, name, score)
+        scores = [s.decode() for s in tally['score_bins'][()]]
+        nuclides = [n.decode() for n in tally['nuclides'][()]]
+        column = nuclides.index(nuclide) * len(scores) + scores.index(score)
+        n = tally['n_realizations'][()]
+        data = tally['results'][:, column, :]
+
+    sum_, sum_sq = data[:, 0], data[:, 1]
+    if statistic == 'sum':
+        return sum_
+    if statistic == 'sum_sq':
+        return sum_sq
+    mean = sum_ / n
+    if statistic == 'mean':
+        return mean
+    std_dev = np.sqrt(np.maximum(sum_sq / n - mean**2, 0) / (n - 1))
+    if statistic == 'std_dev':
+        return std_dev
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(mean != 0, std_dev / np.abs(mean), 0.)
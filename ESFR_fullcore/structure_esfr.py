@@ -1,12 +1,11 @@
-import matplotlib.pyplot as plt 
 import openmc
-import numpy as np 
+import numpy as np
 
-from matter_esfr import inner_fuel, outer_fuel, sodium, clad_mat, EM10, follower, boron_carbide
+import matter_esfr as matter
 
 
 #############################################################################################
-######### ---------------  REGIONS --------------------- ####################################
+######### ---------------  PARAMETERS ------------------ ####################################
 #############################################################################################
 
 # lengths of pins
@@ -24,156 +23,206 @@ h_top_ar = 70                # cm, height of axial reflector (top)
 h_bottom_ar = 30             # cm, height of axial reflector (bottom)
 crod_insertion_length = 30   # cm, how far the contron rods are inserted into the core
 
-# all zplanes
-ar_top = openmc.ZPlane(z0=+( FA_height/2+h_top_ar ), boundary_type='vacuum')                        # axial reflector (top)
-ar_bottom = openmc.ZPlane(z0=-( FA_height/2+h_bottom_ar ), boundary_type='vacuum') 					# axial reflector (bottom)
-FA_top = openmc.ZPlane(z0=+FA_height/2, boundary_type='transmission')								# fuel assemblies (top) 
-FA_bottom = openmc.ZPlane(z0=-FA_height/2, boundary_type='transmission') 							# fuel assemblies (bottom)
-crod_lower = openmc.ZPlane(z0=+(FA_height/2-crod_insertion_length), boundary_type='transmission')   # bottom cut of control rods (equivalent to upper plane of followers)
-
-# (infinite) cylinder planes of pin cell geometry
-fuel_outer_r = openmc.ZCylinder(r=fuel_outer_d/2, boundary_type='transmission')
-clad_inner_r = openmc.ZCylinder(r=clad_inner_d/2, boundary_type='transmission')
-clad_outer_r = openmc.ZCylinder(r=clad_outer_d/2, boundary_type='transmission')
-
-# (infinite) hexagonal prism planes of pin, assembly and core
-pin_outer_r  = openmc.model.hexagonal_prism(edge_length=edge_len_hexpin, orientation='y', boundary_type='transmission')
-FA_outer_r = openmc.model.hexagonal_prism(edge_length=lattice_edge_len, orientation='x', boundary_type='transmission')
-core_outer_r = openmc.model.hexagonal_prism(edge_length=core_r, orientation='y', boundary_type='vacuum')
-
-# regions: pin cell
-fuel_region = -FA_top & +FA_bottom & -fuel_outer_r					 # normal fuel pin
-gap_region = -FA_top & +FA_bottom & +fuel_outer_r & -clad_inner_r    # fue-clad-gap
-clad_region = -FA_top & +FA_bottom & +clad_inner_r & -clad_outer_r   # cladding
-coolant_region = -FA_top & +FA_bottom & +clad_outer_r & pin_outer_r  # coolant filling fuel pin outside cladding
-solid_pin_region = -FA_top & +FA_bottom & -clad_outer_r              # a "solid" pin of outer radius equal to cladding radius
-wholepin_region = -FA_top & +FA_bottom & pin_outer_r                 # whole pin cell
-
-# regions: control rods and follower
-crod_main_region = -FA_top & +crod_lower & -clad_outer_r             # control rod region dependent on insertion length
-crod_follower_region = -crod_lower & +FA_bottom & -clad_outer_r      # follower filling rest of FA height that is not control rod
-
-# regions: assembly/core
-FA_region = -FA_top & +FA_bottom & FA_outer_r      			# fuel assembly region
-outercore_region = -FA_top & +FA_bottom & core_outer_r      # the core region inclusive radial reflectors, exclusive axial reflectors
-upper_ar_region = -ar_top & + FA_top & core_outer_r         # upper axial reflector 
-lower_ar_region = +ar_bottom & -FA_bottom & core_outer_r    # lower axial reflector 
-
-
+default_params = {'fuel_outer_d': fuel_outer_d,
+				  'clad_inner_d': clad_inner_d,
+				  'clad_outer_d': clad_outer_d,
+				  'edge_len_hexpin': edge_len_hexpin,
+				  'lattice_pitch': lattice_pitch,
+				  'lattice_edge_len': lattice_edge_len,
+				  'core_r': core_r,
+				  'FA_height': FA_height,
+				  'h_top_ar': h_top_ar,
+				  'h_bottom_ar': h_bottom_ar,
+				  'crod_insertion_length': crod_insertion_length,
+				  'inner_fuel': None,          # None: matter_esfr.inner_fuel
+				  'outer_fuel': None}          # None: matter_esfr.outer_fuel
+
+def core_params(**changes):
+	"""default core parameters with the given entries replaced, e.g. core_params(crod_insertion_length=40)"""
+	unknown = set(changes) - set(default_params)
+	if unknown:
+		raise KeyError('unknown core parameters: {}'.format(', '.join(sorted(unknown))))
+
+	params = dict(default_params)
+	params.update(changes)
+	return params
+
+def fuels(p):
+	"""(inner fuel, outer fuel) materials of the parameters p"""
+	inner_fuel = matter.inner_fuel if p['inner_fuel'] is None else p['inner_fuel']
+	outer_fuel = matter.outer_fuel if p['outer_fuel'] is None else p['outer_fuel']
+	return inner_fuel, outer_fuel
 
 
 #############################################################################################
-######### --------------- PIN CELLS --------------------- ###################################
+######### ---------------  CACHES ---------------------- ####################################
 #############################################################################################
 
+# Everything built below is memoized on the parameters it depends on, so rebuilding the core
+# with one changed parameter only creates the objects that actually depend on it.
+_surfaces = {}
+_pin_unis = {}
+_FA_unis = {}
+_cores = {}
 
-###### INNER FUEL ##########################
-
-inner_fuel_cell = openmc.Cell(name='inner fuel')
-inner_fuel_cell.fill = inner_fuel
-inner_fuel_cell.region = fuel_region
-
-inner_gap = openmc.Cell(name='sodium bond')
-inner_gap.fill = sodium
-inner_gap.region = gap_region
-
-inner_clad = openmc.Cell(name='clad')
-inner_clad.fill = clad_mat
-inner_clad.region = clad_region
-
-inner_coolant = openmc.Cell(name='coolant')
-inner_coolant.fill = sodium
-inner_coolant.region = coolant_region
-
-innerfuel_uni = openmc.Universe(cells=(inner_fuel_cell, inner_gap, inner_clad, inner_coolant))
-
-
-###### OUTER FUEL ##########################
+def _cached(cache, key, build):
+	"""return cache[key], calling build() to create it the first time"""
+	if key not in cache:
+		cache[key] = build()
+	return cache[key]
 
-outer_fuel_cell = openmc.Cell(name='outer fuel')
-outer_fuel_cell.fill = outer_fuel
-outer_fuel_cell.region = fuel_region
+def clear_caches():
+	"""forget all memoized surfaces, universes and cores"""
+	for cache in (_surfaces, _pin_unis, _FA_unis, _cores):
+		cache.clear()
 
-outer_gap = openmc.Cell(name='sodium bond')
-outer_gap.fill = sodium
-outer_gap.region = gap_region
-
-outer_clad = openmc.Cell(name='clad')
-outer_clad.fill = clad_mat
-outer_clad.region = clad_region
-
-outer_coolant = openmc.Cell(name='coolant')
-outer_coolant.fill = sodium
-outer_coolant.region = coolant_region
-
-outerfuel_uni = openmc.Universe(cells=(outer_fuel_cell, outer_gap, outer_clad, outer_coolant))
 
+#############################################################################################
+######### ---------------  REGIONS --------------------- ####################################
+#############################################################################################
 
-###### RADIAL REFLECTOR ##########################
+def zplane(z0, boundary_type='transmission'):
+	return _cached(_surfaces, ('zplane', z0, boundary_type),
+				   lambda: openmc.ZPlane(z0=z0, boundary_type=boundary_type))
+
+def zcylinder(r):
+	return _cached(_surfaces, ('zcylinder', r),
+				   lambda: openmc.ZCylinder(r=r, boundary_type='transmission'))
+
+def hexagonal_prism(edge_length, orientation, boundary_type='transmission'):
+	return _cached(_surfaces, ('hexagonal_prism', edge_length, orientation, boundary_type),
+				   lambda: openmc.model.hexagonal_prism(edge_length=edge_length, orientation=orientation,
+														boundary_type=boundary_type))
+
+def regions(p):
+	"""all regions of the core for the parameters p"""
+	# all zplanes
+	ar_top = zplane(+(p['FA_height']/2 + p['h_top_ar']), 'vacuum')                       # axial reflector (top)
+	ar_bottom = zplane(-(p['FA_height']/2 + p['h_bottom_ar']), 'vacuum')                 # axial reflector (bottom)
+	FA_top = zplane(+p['FA_height']/2)                                                   # fuel assemblies (top)
+	FA_bottom = zplane(-p['FA_height']/2)                                                # fuel assemblies (bottom)
+	crod_lower = zplane(+(p['FA_height']/2 - p['crod_insertion_length']))                # bottom cut of control rods (equivalent to upper plane of followers)
+
+	# (infinite) cylinder planes of pin cell geometry
+	fuel_outer_r = zcylinder(p['fuel_outer_d']/2)
+	clad_inner_r = zcylinder(p['clad_inner_d']/2)
+	clad_outer_r = zcylinder(p['clad_outer_d']/2)
+
+	# (infinite) hexagonal prism planes of pin, assembly and core
+	pin_outer_r = hexagonal_prism(p['edge_len_hexpin'], 'y')
+	FA_outer_r = hexagonal_prism(p['lattice_edge_len'], 'x')
+	core_outer_r = hexagonal_prism(p['core_r'], 'y', 'vacuum')
+
+	return {
+		# regions: pin cell
+		'fuel': -FA_top & +FA_bottom & -fuel_outer_r,                       # normal fuel pin
+		'gap': -FA_top & +FA_bottom & +fuel_outer_r & -clad_inner_r,        # fue-clad-gap
+		'clad': -FA_top & +FA_bottom & +clad_inner_r & -clad_outer_r,       # cladding
+		'coolant': -FA_top & +FA_bottom & +clad_outer_r & pin_outer_r,      # coolant filling fuel pin outside cladding
+		'solid_pin': -FA_top & +FA_bottom & -clad_outer_r,                  # a "solid" pin of outer radius equal to cladding radius
+		'wholepin': -FA_top & +FA_bottom & pin_outer_r,                     # whole pin cell
+
+		# regions: control rods and follower
+		'crod_main': -FA_top & +crod_lower & -clad_outer_r,                 # control rod region dependent on insertion length
+		'crod_follower': -crod_lower & +FA_bottom & -clad_outer_r,          # follower filling rest of FA height that is not control rod
+
+		# regions: assembly/core
+		'FA': -FA_top & +FA_bottom & FA_outer_r,                            # fuel assembly region
+		'outercore': -FA_top & +FA_bottom & core_outer_r,                   # the core region inclusive radial reflectors, exclusive axial reflectors
+		'upper_ar': -ar_top & +FA_top & core_outer_r,                       # upper axial reflector
+		'lower_ar': +ar_bottom & -FA_bottom & core_outer_r,                 # lower axial reflector
+	}
+
+def _pin_key(p):
+	return (p['fuel_outer_d'], p['clad_inner_d'], p['clad_outer_d'], p['edge_len_hexpin'], p['FA_height'])
 
-radref_cell = openmc.Cell(name='radial reflector')
-radref_cell.fill = EM10
-radref_cell.region = solid_pin_region
 
-radref_coolant = openmc.Cell(name='coolant')
-radref_coolant.fill = sodium
-radref_coolant.region = coolant_region
+#############################################################################################
+######### --------------- PIN CELLS --------------------- ###################################
+#############################################################################################
 
-radref_uni = openmc.Universe(cells=(radref_cell, radref_coolant))
+def fuel_pin(fuel, name, p):
+	"""fuel pin: fuel, sodium bond, cladding and coolant"""
+	def build():
+		r = regions(p)
 
+		fuel_cell = openmc.Cell(name=name)
+		fuel_cell.fill = fuel
+		fuel_cell.region = r['fuel']
 
-###### ONLY SODIUM ########################
+		gap = openmc.Cell(name='sodium bond')
+		gap.fill = matter.sodium
+		gap.region = r['gap']
 
-# sodium filled pin cell
-single_sodium_cell = openmc.Cell(name='sodium cell')
-single_sodium_cell.fill = sodium
-single_sodium_cell.region = wholepin_region 
+		clad = openmc.Cell(name='clad')
+		clad.fill = matter.clad_mat
+		clad.region = r['clad']
 
-single_sodium_uni= openmc.Universe(cells=[single_sodium_cell])
+		coolant = openmc.Cell(name='coolant')
+		coolant.fill = matter.sodium
+		coolant.region = r['coolant']
 
+		return openmc.Universe(cells=(fuel_cell, gap, clad, coolant))
 
-###### FOLLOWER ########################
+	return _cached(_pin_unis, ('fuel', fuel.id) + _pin_key(p), build)
 
-follower_cell = openmc.Cell(name='follower cell')
-follower_cell.fill = follower
-follower_cell.region = solid_pin_region
+def solid_pin(fill, name, p):
+	"""solid pin of cladding radius surrounded by coolant (radial reflector and follower pins)"""
+	def build():
+		r = regions(p)
 
-follower_coolent = openmc.Cell(name='coolant')
-follower_coolent.fill = sodium
-follower_coolent.region = coolant_region
+		solid_cell = openmc.Cell(name=name)
+		solid_cell.fill = fill
+		solid_cell.region = r['solid_pin']
 
-follower_uni = openmc.Universe(cells=[follower_cell, follower_coolent])
+		coolant = openmc.Cell(name='coolant')
+		coolant.fill = matter.sodium
+		coolant.region = r['coolant']
 
+		return openmc.Universe(cells=[solid_cell, coolant])
 
-###### CONTROL ROD ########################
+	return _cached(_pin_unis, ('solid', fill.id) + _pin_key(p), build)
 
-crod_main_cell = openmc.Cell(name='contol rod cell')
-crod_main_cell.fill = boron_carbide
-crod_main_cell.region = crod_main_region
+def sodium_pin(p):
+	"""sodium filled pin cell"""
+	def build():
+		single_sodium_cell = openmc.Cell(name='sodium cell')
+		single_sodium_cell.fill = matter.sodium
+		single_sodium_cell.region = regions(p)['wholepin']
+		return openmc.Universe(cells=[single_sodium_cell])
 
-crod_follower_cell = openmc.Cell(name='contol rod follower cell')
-crod_follower_cell.fill = follower
-crod_follower_cell.region = crod_follower_region
+	return _cached(_pin_unis, ('sodium',) + _pin_key(p), build)
 
-crod_coolent = openmc.Cell(name='coolant')
-crod_coolent.fill = sodium
-crod_coolent.region = coolant_region
+def crod_pin(p):
+	"""control rod of boron carbide inserted crod_insertion_length into the core, follower below"""
+	def build():
+		r = regions(p)
 
-crod_uni = openmc.Universe(cells=[crod_main_cell,crod_follower_cell, crod_coolent])
+		crod_main_cell = openmc.Cell(name='contol rod cell')
+		crod_main_cell.fill = matter.boron_carbide
+		crod_main_cell.region = r['crod_main']
 
+		crod_follower_cell = openmc.Cell(name='contol rod follower cell')
+		crod_follower_cell.fill = matter.follower
+		crod_follower_cell.region = r['crod_follower']
 
-##### AXIAL REFLECTORS  ##################
+		crod_coolent = openmc.Cell(name='coolant')
+		crod_coolent.fill = matter.sodium
+		crod_coolent.region = r['coolant']
 
-ar_upper_cell = openmc.Cell(name='upper axial reflector cell')
-ar_upper_cell.fill = EM10
-ar_upper_cell.region = upper_ar_region
-ar_upper_uni = openmc.Universe(cells=[ar_upper_cell])
+		return openmc.Universe(cells=[crod_main_cell, crod_follower_cell, crod_coolent])
 
-ar_lower_cell = openmc.Cell(name='lower axial reflector cell')
-ar_lower_cell.fill = EM10
-ar_lower_cell.region = lower_ar_region
-ar_lower_uni = openmc.Universe(cells=[ar_lower_cell])
+	return _cached(_pin_unis, ('crod', p['crod_insertion_length']) + _pin_key(p), build)
 
+def pin_universes(p):
+	"""all pin universes of the core, by name"""
+	inner_fuel, outer_fuel = fuels(p)
+	return {'inner fuel': fuel_pin(inner_fuel, 'inner fuel', p),
+			'outer fuel': fuel_pin(outer_fuel, 'outer fuel', p),
+			'radial reflector': solid_pin(matter.EM10, 'radial reflector', p),
+			'sodium': sodium_pin(p),
+			'follower': solid_pin(matter.follower, 'follower cell', p),
+			'control rod': crod_pin(p)}
 
 
 #############################################################################################
@@ -204,9 +253,9 @@ def crod_array(fuel_uni, other_uni):
 		ring3  += [fuel_uni]   + [other_uni]
 		ring4  += [other_uni]  + [fuel_uni]*2
 		ring5  += [fuel_uni]*2 + [other_uni]  + [fuel_uni]
-		ring6  += [fuel_uni]   + [other_uni]  + [fuel_uni]*2 + [other_uni] 
-		ring7  += [other_uni]  + [fuel_uni]*2 + [other_uni]  + [fuel_uni]*2 
-		ring8  += [fuel_uni]*2 + [other_uni]  + [fuel_uni]*2 + [other_uni]  + [fuel_uni] 
+		ring6  += [fuel_uni]   + [other_uni]  + [fuel_uni]*2 + [other_uni]
+		ring7  += [other_uni]  + [fuel_uni]*2 + [other_uni]  + [fuel_uni]*2
+		ring8  += [fuel_uni]*2 + [other_uni]  + [fuel_uni]*2 + [other_uni]  + [fuel_uni]
 		ring9  += [other_uni]  + [fuel_uni]*7
 		ring10 += [fuel_uni]*3 + [other_uni]  + [fuel_uni]*2 + [other_uni]  + [fuel_uni]*2
 
@@ -223,188 +272,202 @@ def crod_array(fuel_uni, other_uni):
 
 	return ass_array
 
-###### INNER FA ############################
-
-iFA_sodium_cell = openmc.Cell(fill=sodium)
-iFA_outer_universe = openmc.Universe(cells=[iFA_sodium_cell])
-
-iFA_lat = openmc.HexLattice(name='inner FA')
-iFA_lat.center = (0, 0)
-iFA_lat.pitch = (lattice_pitch/17,)
-iFA_lat.orientation = 'x'
-iFA_lat.outer = iFA_outer_universe
-
-iFA_lat.universes = standardFA(innerfuel_uni, single_sodium_uni)
-iFA_cell  = openmc.Cell(fill=iFA_lat, region=FA_region)
-iFA_uni = openmc.Universe(cells=[iFA_cell], name='inner FA universe')
-
-
-###### OUTER FA ############################
-
-oFA_sodium_cell = openmc.Cell(fill=sodium)
-oFA_outer_universe = openmc.Universe(cells=[oFA_sodium_cell])
-
-oFA_lat = openmc.HexLattice(name='inner FA')
-oFA_lat.center = (0, 0)
-oFA_lat.pitch = (lattice_pitch/17,)
-oFA_lat.orientation = 'x'
-oFA_lat.outer = oFA_outer_universe
-
-oFA_lat.universes = standardFA(outerfuel_uni, single_sodium_uni)
-oFA_cell = openmc.Cell(fill=oFA_lat, region=FA_region)
-oFA_uni = openmc.Universe(cells=[oFA_cell])
-
-
-###### RADIAL REFLECTOR ASSEMBLY ############################
-
-radref_ass_sodium_cell = openmc.Cell(fill=sodium)
-radref_ass_outer_universe = openmc.Universe(cells=[radref_ass_sodium_cell])
-
-radref_ass_lat = openmc.HexLattice(name='radial reflector')
-radref_ass_lat.center = (0, 0)
-radref_ass_lat.pitch = (lattice_pitch/17,)
-radref_ass_lat.orientation = 'x'
-radref_ass_lat.outer = radref_ass_outer_universe
-
-radref_ass_lat.universes = standardFA(radref_uni, radref_uni)
-radref_ass_cell = openmc.Cell(fill=radref_ass_lat, region=FA_region)
-radref_ass_uni = openmc.Universe(cells=[radref_ass_cell])
-
-
-###### INNER CSD ASSEMBLY ############################
-# Control Shutdown Devices in the inner fuel region
-
-CSDinner_sodium_cell = openmc.Cell(fill=sodium)
-CSDinner_outer_universe = openmc.Universe(cells=[CSDinner_sodium_cell])
-
-CSDinner_lat = openmc.HexLattice(name='CSD')
-CSDinner_lat.center = (0, 0)
-CSDinner_lat.pitch = (lattice_pitch/17,)
-CSDinner_lat.orientation = 'x'
-CSDinner_lat.outer = CSDinner_outer_universe
-CSDinner_lat.universes = crod_array(innerfuel_uni, crod_uni)
-
-CSDinner_cell = openmc.Cell(fill=CSDinner_lat, region=FA_region)
-CSDinner_ass_uni = openmc.Universe(cells=[CSDinner_cell])
-
-
-###### OUTER CSD ASSEMBLY ############################
-# Control Shutdown Devices in the outer fuel region
-
-CSDouter_sodium_cell = openmc.Cell(fill=sodium)
-CSDouter_outer_universe = openmc.Universe(cells=[CSDouter_sodium_cell])
-
-CSDouter_lat = openmc.HexLattice(name='CSD')
-CSDouter_lat.center = (0, 0)
-CSDouter_lat.pitch = (lattice_pitch/17,)
-CSDouter_lat.orientation = 'x'
-CSDouter_lat.outer = CSDouter_outer_universe
-CSDouter_lat.universes = crod_array(outerfuel_uni, crod_uni)
-
-CSDouter_cell = openmc.Cell(fill=CSDouter_lat, region=FA_region)
-CSDouter_ass_uni = openmc.Universe(cells=[CSDouter_cell])
-
-###### DSD ASSEMBLY ############################
-# Diverse Shutdown Devices in the inner fuel region
-
-DSD_sodium_cell = openmc.Cell(fill=sodium)
-DSD_outer_universe = openmc.Universe(cells=[DSD_sodium_cell])
-
-DSD_lat = openmc.HexLattice(name='CSD')
-DSD_lat.center = (0, 0)
-DSD_lat.pitch = (lattice_pitch/17,)
-DSD_lat.orientation = 'x'
-DSD_lat.outer = DSD_outer_universe
-DSD_lat.universes = crod_array(innerfuel_uni, follower_uni)
-
-DSD_cell = openmc.Cell(fill=DSD_lat, region=FA_region)
-DSD_ass_uni = openmc.Universe(cells=[DSD_cell])
+def assembly(name, layout, fuel_uni, other_uni, p):
+	"""hexagonal assembly of pins arranged by layout (standardFA or crod_array), surrounded by sodium"""
+	def build():
+		sodium_cell = openmc.Cell(fill=matter.sodium)
+		outer_universe = openmc.Universe(cells=[sodium_cell])
+
+		lat = openmc.HexLattice(name=name)
+		lat.center = (0, 0)
+		lat.pitch = (p['lattice_pitch']/17,)
+		lat.orientation = 'x'
+		lat.outer = outer_universe
+		lat.universes = layout(fuel_uni, other_uni)
+
+		cell = openmc.Cell(fill=lat, region=regions(p)['FA'])
+		return openmc.Universe(cells=[cell], name=name + ' universe')
+
+	key = (name, layout.__name__, fuel_uni.id, other_uni.id,
+		   p['lattice_pitch'], p['lattice_edge_len'], p['FA_height'])
+	return _cached(_FA_unis, key, build)
+
+def assembly_universes(pins, p):
+	"""all assembly universes of the core, by name"""
+	return {# inner and outer fuel assemblies
+			'iFA': assembly('inner FA', standardFA, pins['inner fuel'], pins['sodium'], p),
+			'oFA': assembly('outer FA', standardFA, pins['outer fuel'], pins['sodium'], p),
+			'radref': assembly('radial reflector', standardFA, pins['radial reflector'], pins['radial reflector'], p),
+			# Control Shutdown Devices in the inner and outer fuel region
+			'CSDinner': assembly('inner CSD', crod_array, pins['inner fuel'], pins['control rod'], p),
+			'CSDouter': assembly('outer CSD', crod_array, pins['outer fuel'], pins['control rod'], p),
+			# Diverse Shutdown Devices in the inner fuel region
+			'DSD': assembly('DSD', crod_array, pins['inner fuel'], pins['follower'], p)}
+
+def assembly_lattice(FA_uni):
+	"""the pin lattice filling the single cell of an assembly universe"""
+	return next(iter(FA_uni.cells.values())).fill
 
 
 #############################################################################################
 ######### --------------- FULL CORE --------------------- ###################################
 #############################################################################################
 
-# OUTER UNIVERSE (of sodium)
-core_sodium_cell = openmc.Cell(fill=sodium)
-core_outer_universe = openmc.Universe(cells=[core_sodium_cell])
-
-core_lat = openmc.HexLattice(name='fullcore')
-core_lat.center = (0, 0)
-core_lat.pitch = (lattice_pitch,)
-core_lat.orientation = 'y'
-core_lat.outer = core_outer_universe
-
-
-# mixed rings in core 
-ring4 = []; ring7 = [iFA_uni]; ring10 = []; 
-ring11 = []; ring13 = []; ring14 = []
-
-for i in range(6):
-	ring10 += [oFA_uni]*2 + [CSDouter_ass_uni] + [iFA_uni]*4 + [CSDouter_ass_uni] + [oFA_uni]
-	ring4 += [CSDinner_ass_uni] + [iFA_uni]*2 
-	ring11 += [oFA_uni]*5 + [CSDouter_ass_uni] + [oFA_uni]*4
-	ring13 += [radref_ass_uni] + [oFA_uni]*11
-	ring14 += [radref_ass_uni]*5 + [oFA_uni]*4 + [radref_ass_uni]*4
-
-for i in range(8):
-	ring7 += [DSD_ass_uni] + [iFA_uni]*3 
-ring7 += [DSD_ass_uni] + [iFA_uni]*2 
-
-core_uni_grid = np.array([ [radref_ass_uni]*96,
-						   [radref_ass_uni]*90,
-						   [radref_ass_uni]*84,
-						   ring14,
-						   ring13,
-						   [oFA_uni]*66,
-						   ring11,
-						   ring10,
-						   [iFA_uni]*48,
-						   [iFA_uni]*42,
-						   ring7,
-						   [iFA_uni]*30,
-						   [iFA_uni]*24,
-						   ring4,
-						   [iFA_uni]*12,
-						   [iFA_uni]*6,
-						   [radref_ass_uni] ], dtype=openmc.Universe)
+def core_map(FA):
+	"""ring pattern of the full core lattice, FA is a dict of assembly universes"""
+	iFA_uni, oFA_uni, radref_ass_uni = FA['iFA'], FA['oFA'], FA['radref']
+	CSDinner_ass_uni, CSDouter_ass_uni, DSD_ass_uni = FA['CSDinner'], FA['CSDouter'], FA['DSD']
 
-core_lat.universes = core_uni_grid
-core_cell = openmc.Cell(fill=core_lat, region=outercore_region)
-core_uni = openmc.Universe(cells=[core_cell, ar_lower_cell, ar_upper_cell])
+	# mixed rings in core
+	ring4 = []; ring7 = [iFA_uni]; ring10 = [];
+	ring11 = []; ring13 = []; ring14 = []
 
-# export full core geometry
-geometry = openmc.Geometry()
-geometry.root_universe = core_uni 
+	for i in range(6):
+		ring10 += [oFA_uni]*2 + [CSDouter_ass_uni] + [iFA_uni]*4 + [CSDouter_ass_uni] + [oFA_uni]
+		ring4 += [CSDinner_ass_uni] + [iFA_uni]*2
+		ring11 += [oFA_uni]*5 + [CSDouter_ass_uni] + [oFA_uni]*4
+		ring13 += [radref_ass_uni] + [oFA_uni]*11
+		ring14 += [radref_ass_uni]*5 + [oFA_uni]*4 + [radref_ass_uni]*4
+
+	for i in range(8):
+		ring7 += [DSD_ass_uni] + [iFA_uni]*3
+	ring7 += [DSD_ass_uni] + [iFA_uni]*2
+
+	core_uni_grid = np.array([ [radref_ass_uni]*96,
+							   [radref_ass_uni]*90,
+							   [radref_ass_uni]*84,
+							   ring14,
+							   ring13,
+							   [oFA_uni]*66,
+							   ring11,
+							   ring10,
+							   [iFA_uni]*48,
+							   [iFA_uni]*42,
+							   ring7,
+							   [iFA_uni]*30,
+							   [iFA_uni]*24,
+							   ring4,
+							   [iFA_uni]*12,
+							   [iFA_uni]*6,
+							   [radref_ass_uni] ], dtype=openmc.Universe)
+
+	return core_uni_grid
+
+def build_core(params=None):
+	"""
+	Build the full ESFR core for params (see core_params, default_params if None).
+
+	Returns a dict with the 'geometry', the 'core_lat' lattice, its 'core_uni_grid' and the
+	'assemblies' and 'pins' universes by name. Pin and assembly universes are memoized on the
+	parameters they depend on, so e.g. a sweep over crod_insertion_length reuses all fuel
+	and reflector assemblies and only rebuilds the control rod assemblies.
+	"""
+	p = default_params if params is None else params
+
+	pins = pin_universes(p)
+	FA = assembly_universes(pins, p)
+
+	def build():
+		r = regions(p)
+
+		# OUTER UNIVERSE (of sodium)
+		core_sodium_cell = openmc.Cell(fill=matter.sodium)
+		core_outer_universe = openmc.Universe(cells=[core_sodium_cell])
+
+		core_lat = openmc.HexLattice(name='fullcore')
+		core_lat.center = (0, 0)
+		core_lat.pitch = (p['lattice_pitch'],)
+		core_lat.orientation = 'y'
+		core_lat.outer = core_outer_universe
+		core_uni_grid = core_map(FA)
+		core_lat.universes = core_uni_grid
+
+		##### AXIAL REFLECTORS  ##################
+		ar_upper_cell = openmc.Cell(name='upper axial reflector cell')
+		ar_upper_cell.fill = matter.EM10
+		ar_upper_cell.region = r['upper_ar']
+
+		ar_lower_cell = openmc.Cell(name='lower axial reflector cell')
+		ar_lower_cell.fill = matter.EM10
+		ar_lower_cell.region = r['lower_ar']
+
+		core_cell = openmc.Cell(fill=core_lat, region=r['outercore'])
+		core_uni = openmc.Universe(cells=[core_cell, ar_lower_cell, ar_upper_cell])
+
+		# full core geometry
+		geometry = openmc.Geometry()
+		geometry.root_universe = core_uni
+
+		return {'geometry': geometry,
+				'core_lat': core_lat,
+				'core_uni_grid': core_uni_grid,
+				'assemblies': FA,
+				'pins': pins,
+				'params': p}
+
+	key = tuple(FA[name].id for name in sorted(FA)) + (p['lattice_pitch'], p['core_r'], p['FA_height'],
+													   p['h_top_ar'], p['h_bottom_ar'])
+	return _cached(_cores, key, build)
+
+
+def ring_positions(n_rings, pitch, orientation):
+	"""
+	(x, y) centers of the elements of a 2D HexLattice with n_rings rings, as a list of arrays of
+	shape (n, 2) in the order of lattice.universes (outermost ring first, each ring starting at
+	the top for orientation 'y' or at the right for 'x' and going clockwise)
+	"""
+	start = 90. if orientation == 'y' else 0.
+	positions = []
+	for i in range(n_rings):
+		k = n_rings - 1 - i
+		if k == 0:
+			positions.append(np.zeros((1, 2)))
+			continue
+		# corners of the ring, clockwise, and k elements along each side
+		angles = np.radians(start - 60. * np.arange(7))
+		corners = k * pitch * np.column_stack([np.cos(angles), np.sin(angles)])
+		j = np.arange(6 * k)
+		side, t = j // k, (j % k)[:, None] / k
+		positions.append(corners[side] + t * (corners[side + 1] - corners[side]))
+	return positions
+
+def lattice_positions(lattice):
+	"""element centers (x, y) of a 2D HexLattice relative to its center, in the order of its universes"""
+	return ring_positions(len(lattice.universes), lattice.pitch[0], lattice.orientation)
 
 
 #############################################################################################
 ######### --------------- PLOTTING --------------------- ####################################
 #############################################################################################
 
-colordef = {inner_fuel: 'darkmagenta', 
-			outer_fuel: 'cyan', 
-			sodium: 'darkorange', 
-			clad_mat: 'grey', 
-			EM10: 'forestgreen',
-			follower: 'rosybrown',
-			boron_carbide: 'firebrick'}
-
-# iFA_uni.plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef)
-# oFA_uni.plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef)
-# radref_ass_uni.plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef)
-
-# CSDinner_ass_uni.plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef)
-# CSDinner_ass_uni.plot(origin = (0,0,0), basis='xz', pixels=(2000, 2000), width = (25.,100.), color_by = 'material', colors=colordef)
-# CSDouter_ass_uni.plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef)
-# CSDouter_ass_uni.plot(origin = (0,0,0), basis='xz', pixels=(2000, 2000), width = (25.,100.), color_by = 'material', colors=colordef)
-# DSD_ass_uni.plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef)
-# DSD_ass_uni.plot(origin = (0,0,0), basis='xz', pixels=(2000, 2000), width = (25.,100.), color_by = 'material', colors=colordef)
-
-
-# core_uni.plot(origin = (0,0,0), basis='xy', pixels=(4000, 4000), width = (800.,800.), color_by = 'material', colors=colordef)
-# core_uni.plot(origin = (0,0,0), basis='xz', pixels=(4000, 4000), width = (800.,230.), color_by = 'material', colors=colordef)
-
+def colordef():
+	"""material colors for plotting"""
+	return {matter.inner_fuel: 'darkmagenta',
+			matter.outer_fuel: 'cyan',
+			matter.sodium: 'darkorange',
+			matter.clad_mat: 'grey',
+			matter.EM10: 'forestgreen',
+			matter.follower: 'rosybrown',
+			matter.boron_carbide: 'firebrick'}
+
+# FA = build_core()['assemblies']
+# FA['iFA'].plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef())
+# FA['oFA'].plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef())
+# FA['radref'].plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef())
+
+# FA['CSDinner'].plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef())
+# FA['CSDinner'].plot(origin = (0,0,0), basis='xz', pixels=(2000, 2000), width = (25.,100.), color_by = 'material', colors=colordef())
+# FA['CSDouter'].plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef())
+# FA['CSDouter'].plot(origin = (0,0,0), basis='xz', pixels=(2000, 2000), width = (25.,100.), color_by = 'material', colors=colordef())
+# FA['DSD'].plot(origin = (0,0,0), basis='xy', pixels=(2000, 2000), width = (25.,25.), color_by = 'material', colors=colordef())
+# FA['DSD'].plot(origin = (0,0,0), basis='xz', pixels=(2000, 2000), width = (25.,100.), color_by = 'material', colors=colordef())
+
+
+# core_uni = build_core()['geometry'].root_universe
+# core_uni.plot(origin = (0,0,0), basis='xy', pixels=(4000, 4000), width = (800.,800.), color_by = 'material', colors=colordef())
+# core_uni.plot(origin = (0,0,0), basis='xz', pixels=(4000, 4000), width = (800.,230.), color_by = 'material', colors=colordef())
+
+# import matplotlib.pyplot as plt
 # plt.show()
 
 
@@ -418,7 +481,3 @@ With depleted uranium as radial reflector, the reactor was barely critical (with
 Had to switch.
 
 """
-
-
-
-
@@ -0,0 +1,158 @@
+import json
+
+import numpy as np
+import h5py
+
+from statepoint_reader import tally_mesh, read_text, index_window, requested_names, matches
+
+"""
+Compact archive of selected tallies of a statepoint.
+
+Statepoints keep the sum and sum of squares of every bin in float64 plus the source bank,
+although the processing scripts only plot means. export_archive() stores the mean and
+relative error of the selected tallies and scores as float32, together with the filter
+metadata and mesh geometry, and an index by tally name and score. 2D mesh tallies are
+stored as (ny, nx) images.
+
+With compression (default) the datasets are chunked in tiles and gzip compressed, and
+read_mesh_window() only decompresses the tiles of the requested window. Without
+compression they are stored contiguous and read through a memory map.
+"""
+
+archive_format = 'tally archive'
+
+def _tally_columns(tally, scores=None, nuclides=None):
+    """(column, nuclide, score) of the results of tally to export"""
+    tally_scores = [s.decode() for s in tally['score_bins'][()]]
+    tally_nuclides = [n.decode() for n in tally['nuclides'][()]]
+    for i, nuclide in enumerate(tally_nuclides):
+        for j, score in enumerate(tally_scores):
+            if (scores is None or score in scores) and (nuclides is None or nuclide in nuclides):
+                yield i * len(tally_scores) + j, nuclide, score
+
+def _mean_rel_err(results, column, n, max_bins):
+    """float32 mean and relative error of one results column, read max_bins bins at a time"""
+    n_bins = results.shape[0]
+    mean = np.empty(n_bins, dtype=np.float32)
+    rel_err = np.empty(n_bins, dtype=np.float32)
+    for i in range(0, n_bins, max_bins):
+        block = results[i:i + max_bins, column, :]
+        m = block[:, 0] / n
+        std_dev = np.sqrt(np.maximum(block[:, 1] / n - m**2, 0) / (n - 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel_err[i:i + max_bins] = np.where(m != 0, std_dev / np.abs(m), 0.)
+        mean[i:i + max_bins] = m
+    return mean, rel_err
+
+def export_archive(statepoint, path, names=None, scores=None, nuclides=('total',), compression='gzip',
+                   max_bins=1000000):
+    """
+    Write the tallies of statepoint with a name in names (all if None) to the archive path,
+    a merged tally (see tally_planner.py) if any of its requested names is in names.
+
+    Only the given scores and nuclides (all if None) are kept. compression=None writes
+    uncompressed contiguous datasets that are memory mapped on reading.
+    """
+    index = []
+    with h5py.File(statepoint, 'r') as sp, h5py.File(path, 'w') as archive:
+        archive.attrs['format'] = archive_format
+        archive.attrs['statepoint'] = str(statepoint)
+
+        for tally_id in sp['tallies'].attrs['ids']:
+            tally = sp['tallies/tally {}'.format(tally_id)]
+            name = read_text(tally['name']) if 'name' in tally else ''
+            if 'results' not in tally or (names is not None and not set(requested_names(name)) & set(names)):
+                continue
+
+            # filter metadata and mesh geometry
+            group = archive.create_group('tally {}'.format(tally_id))
+            group.attrs['name'] = name
+            group.attrs['n_realizations'] = tally['n_realizations'][()]
+            filter_ids = tally['filters'][()] if tally['n_filters'][()] > 0 else []
+            for filter_id in filter_ids:
+                sp.copy(sp['tallies/filters/filter {}'.format(filter_id)], group, 'filter {}'.format(filter_id))
+            group.attrs['filters'] = np.array(filter_ids, dtype=int)
+
+            try:
+                dimension, lower_left, width = tally_mesh(sp, tally)
+                shape = (int(dimension[1]), int(dimension[0]))
+                group.attrs['mesh_lower_left'] = lower_left[:2]
+                group.attrs['mesh_width'] = width[:2]
+            except ValueError:
+                shape = (tally['results'].shape[0],)
+
+            if compression is None:
+                options = {}
+            else:
+                options = {'compression': compression, 'shuffle': True,
+                           'chunks': tuple(min(n, 128) for n in shape) if len(shape) == 2 else (min(shape[0], 65536),)}
+
+            n = group.attrs['n_realizations']
+            for column, nuclide, score in _tally_columns(tally, scores, nuclides):
+                mean, rel_err = _mean_rel_err(tally['results'], column, n, max_bins)
+                data = group.create_group('{} {}'.format(nuclide, score))
+                data.create_dataset('mean', data=mean.reshape(shape), **options)
+                data.create_dataset('rel_err', data=rel_err.reshape(shape), **options)
+                index.append({'name': name, 'id': int(tally_id), 'nuclide': nuclide, 'score': score,
+                              'path': data.name, 'shape': list(shape)})
+
+        archive.attrs['index'] = json.dumps(index)
+
+    return index
+
+def is_archive(path):
+    with h5py.File(path, 'r') as f:
+        return f.attrs.get('format') == archive_format
+
+def read_index(path):
+    """list of the archived tallies: name, id, nuclide, score, path and shape of each"""
+    with h5py.File(path, 'r') as f:
+        return json.loads(f.attrs['index'])
+
+def find(index, name=None, score=None, nuclide='total'):
+    for entry in index:
+        if (matches(entry['name'], [entry['score']], name, score) and (score is None or entry['score'] == score)
+                and entry['nuclide'] == nuclide):
+            return entry
+    raise LookupError('no archived tally with name={!r} and score={!r}'.format(name, score))
+
+def _read(path, dataset, selection):
+    offset = dataset.id.get_offset()
+    if dataset.chunks is None and dataset.compression is None and offset is not None:
+        data = np.memmap(path, dtype=dataset.dtype, mode='r', offset=offset, shape=dataset.shape)
+        return np.array(data[selection])
+    return dataset[selection]
+
+def read_mesh_window(path, name=None, score='flux', statistic='mean', window=None, nuclide='total'):
+    """
+    Same as statepoint_reader.read_mesh_window, for a 2D mesh tally in an archive.
+
+    statistic is one of 'mean', 'rel_err' and 'std_dev'.
+    """
+    entry = find(read_index(path), name, score, nuclide)
+    with h5py.File(path, 'r') as f:
+        group = f[entry['path']]
+        tally = group.parent
+        if 'mesh_lower_left' not in tally.attrs:
+            raise ValueError('only 2D mesh tallies can be read by window')
+
+        ny, nx = entry['shape']
+        lower_left, width = tally.attrs['mesh_lower_left'], tally.attrs['mesh_width']
+        rows, cols = index_window((nx, ny), lower_left, width, window)
+
+        if statistic in ('mean', 'rel_err'):
+            values = _read(path, group[statistic], (rows, cols))
+        elif statistic == 'std_dev':
+            values = _read(path, group['rel_err'], (rows, cols)) * np.abs(_read(path, group['mean'], (rows, cols)))
+        else:
+            raise ValueError("statistic must be one of 'mean', 'rel_err' and 'std_dev'")
+
+    extent = (lower_left[0] + cols.start * width[0], lower_left[0] + cols.stop * width[0],
+              lower_left[1] + rows.start * width[1], lower_left[1] + rows.stop * width[1])
+    return values, tuple(float(x) for x in extent)
+
+def read_tally(path, name=None, score=None, statistic='mean', nuclide='total'):
+    """whole archived array of one tally and score, e.g. of a tally that is not a 2D mesh"""
+    entry = find(read_index(path), name, score, nuclide)
+    with h5py.File(path, 'r') as f:
+        return _read(path, f[entry['path']][statistic], ())
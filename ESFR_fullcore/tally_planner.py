@@ -0,0 +1,78 @@
+import numpy as np
+
+import openmc
+
+from statepoint_reader import name_separator, score_separator, requested, requested_names
+
+"""
+Planning of the tallies of a model from requested (name, filters, scores).
+
+Two tallies over the same filters, like the flux and prompt neutron maps of main_esfr.py on
+the same 1000x1000 mesh, make OpenMC find the filter bins twice for every scoring event and
+store the filter bins twice in the statepoint. plan() merges all requests with the same
+filter stack (filters of the same type and bins in the same order, e.g. MeshFilters of two
+identical meshes), nuclides and estimator into one tally with the scores of all of them.
+
+A merged tally is named by the requested names, each with the scores it asked for, joined
+by ' | ', e.g. 'Neutron flux: flux | prompt n: prompt-nu-fission'. statepoint_reader.py and
+tally_archive.py find it by any of these names, and only with the scores of that name, so
+the processing scripts keep using the requested names. scores_of() gives the scores a name
+asked for, e.g. for its triggers. All of this is in the name, so it holds for the tallies
+of a statepoint, of the run cache or read back from tallies.xml as well.
+"""
+
+def _filter_key(f):
+    if isinstance(f, openmc.MeshFilter):
+        mesh = f.mesh
+        if isinstance(mesh, openmc.RegularMesh):
+            upper = mesh.upper_right if mesh.upper_right is not None else np.array(mesh.lower_left) + np.array(mesh.width) * mesh.dimension
+            return ('MeshFilter', tuple(mesh.dimension), tuple(np.round(mesh.lower_left, 12)),
+                    tuple(np.round(upper, 12)))
+        return ('MeshFilter', mesh.id)
+    return (type(f).__name__, tuple(np.ravel(f.bins)))
+
+def _request_key(filters, nuclides, estimator):
+    return (tuple(_filter_key(f) for f in filters), tuple(nuclides or ()), estimator)
+
+def plan(requests):
+    """
+    openmc.Tallies for requests = [(name, filters, scores)] or [(name, filters, scores,
+    nuclides, estimator)], with the requests of equal filters, nuclides and estimator merged
+    """
+    groups = {}
+    for request in requests:
+        name, filters, scores = request[:3]
+        nuclides, estimator = (tuple(request[3:]) + (None, None))[:2]
+        for separator in (name_separator, score_separator):
+            if separator in name:
+                raise ValueError('tally name {!r} contains {!r}'.format(name, separator))
+        scores = [scores] if isinstance(scores, str) else list(scores)
+        groups.setdefault(_request_key(filters, nuclides, estimator), []).append((name, filters, scores, nuclides, estimator))
+
+    tallies = openmc.Tallies()
+    for merged in groups.values():
+        name, filters, _, nuclides, estimator = merged[0]
+        if len(merged) == 1:
+            tally = openmc.Tally(name=name)
+        else:
+            tally = openmc.Tally(name=name_separator.join(request[0] + score_separator + ' '.join(request[2])
+                                                          for request in merged))
+        tally.filters = list(filters)
+        tally.scores = list(dict.fromkeys(score for request in merged for score in request[2]))
+        if nuclides:
+            tally.nuclides = list(nuclides)
+        if estimator is not None:
+            tally.estimator = estimator
+        tallies.append(tally)
+    return tallies
+
+def find(tallies, name):
+    """the tally of tallies requested as name"""
+    for tally in tallies:
+        if name in requested_names(tally.name):
+            return tally
+    raise LookupError('no tally named {!r} in the model'.format(name))
+
+def scores_of(tally, name):
+    """the scores requested as name in tally (all scores of a tally that was not merged)"""
+    return list(requested(tally.name).get(name) or tally.scores)
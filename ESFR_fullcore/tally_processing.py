@@ -1,35 +1,78 @@
-import matplotlib.pyplot as plt 
-import openmc
-import numpy as np 
-
-# Load the statepoint file
-#sp = openmc.StatePoint('statepoint.100.h5')
-sp = openmc.StatePoint('tallies10000particles.100.h5')
-
-tally_nf = sp.get_tally(scores=['flux'])
-flux = tally_nf.get_slice(scores=['flux'])
-flux_id = sp.tallies[tally_nf.id]
-flux_mean = flux_id.mean
-flux_mean.shape = [1000,1000] 
-
-fig = plt.subplot(111)
-imshow = fig.imshow(flux_mean)
-plt.colorbar(imshow)
-plt.xlabel('x-grid')
-plt.ylabel('y-grid')
-plt.title('Neutron flux distribution in ESFR model')
-plt.show()
-
-
-tally_pn = sp.get_tally(scores=['prompt-nu-fission'])
-prompt_n = tally_pn.get_slice(scores=['prompt-nu-fission'])
-prompt_n.mean.shape = [1000,1000]
-
-fig = plt.subplot(111)
-imshow = fig.imshow(prompt_n.mean)
-plt.colorbar(imshow)
-plt.xlabel('x-grid')
-plt.ylabel('y-grid')
-plt.title('Prompt neutron production sites in ESFR model')
-plt.show()
+import matplotlib.pyplot as plt
 
+import statepoint_reader
+import tally_archive
+
+def plot_maps(statepoint='tallies10000particles.100.h5', window=None, sectors=None):
+    """
+    neutron flux and prompt neutron production maps of the 1000x1000 mesh tallies,
+    statepoint can also be a tally archive (see tally_archive.py),
+    only the bins inside window = (x0, x1, y0, y1) in cm are read if given,
+    the tallies of a run of a 1/sectors sector are unfolded to the full core (see sector_esfr.py)
+    """
+    if tally_archive.is_archive(statepoint):
+        read_mesh_window = tally_archive.read_mesh_window
+    else:
+        read_mesh_window = statepoint_reader.read_mesh_window
+
+    if sectors:
+        # the whole sector is needed for any window of the full core
+        from sector_esfr import unfold
+        read_sector = read_mesh_window
+
+        def read_mesh_window(statepoint, score, window):
+            return unfold(*read_sector(statepoint, score=score, window=None), sectors, window=window)
+
+    # Load only the means of the wanted score and window from the statepoint file
+    flux_mean, extent = read_mesh_window(statepoint, score='flux', window=window)
+
+    fig = plt.subplot(111)
+    imshow = fig.imshow(flux_mean, extent=extent, origin='lower')
+    plt.colorbar(imshow)
+    plt.xlabel('x [cm]')
+    plt.ylabel('y [cm]')
+    plt.title('Neutron flux distribution in ESFR model')
+    plt.show()
+
+
+    prompt_n_mean, extent = read_mesh_window(statepoint, score='prompt-nu-fission', window=window)
+
+    fig = plt.subplot(111)
+    imshow = fig.imshow(prompt_n_mean, extent=extent, origin='lower')
+    plt.colorbar(imshow)
+    plt.xlabel('x [cm]')
+    plt.ylabel('y [cm]')
+    plt.title('Prompt neutron production sites in ESFR model')
+    plt.show()
+
+def plot_lattice_maps(statepoint='statepoint.100.h5', params=None):
+    """
+    neutron flux per assembly and prompt neutron production per fuel pin of the tallies of
+    lattice_tallies.py, statepoint can also be a tally archive (see tally_archive.py)
+    """
+    from lattice_tallies import lattice_map
+
+    if tally_archive.is_archive(statepoint):
+        read_tally = tally_archive.read_tally
+    else:
+        read_tally = statepoint_reader.read_tally
+
+    for level, score, marker, size, title in (('assemblies', 'flux', 'h', 40, 'Neutron flux per assembly'),
+                                              ('pins', 'prompt-nu-fission', 'h', 0.2, 'Prompt neutron production per fuel pin')):
+        values, positions = lattice_map(read_tally, statepoint, level, score, params)
+
+        fig = plt.subplot(111)
+        scatter = fig.scatter(positions[:, 0], positions[:, 1], c=values, marker=marker, s=size, linewidths=0)
+        plt.colorbar(scatter)
+        fig.set_aspect('equal')
+        plt.xlabel('x [cm]')
+        plt.ylabel('y [cm]')
+        plt.title('{} in ESFR model'.format(title))
+        plt.show()
+
+
+
+if __name__ == '__main__':
+    #plot_maps('statepoint.100.h5')
+    #plot_maps(window=(0, 100, 0, 100))   # one corner of the inner core
+    plot_maps()
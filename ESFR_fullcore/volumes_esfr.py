@@ -0,0 +1,138 @@
+import os
+
+import numpy as np
+
+import matter_esfr as matter
+from structure_esfr import build_core, default_params, fuels, assembly_lattice
+
+"""
+Analytical volumes of the materials of the ESFR.
+
+The pin universes of every assembly lattice are counted, the assemblies of core_lat are
+counted, and the volume of each material follows from the pin radii, the hexagonal lattice
+elements and the axial heights. The volumes therefore follow the loading pattern and the
+parameters without any hardcoded assembly or pin counts. check_volumes() compares them with
+a stochastic openmc.VolumeCalculation of the same model.
+
+The corners of the outermost ring of radial reflector assemblies reach outside the hexagonal
+core prism (core_outer_r), which is not subtracted, so the EM10 and sodium volumes of the
+reflector are slightly too large. The burnable materials are all well inside.
+"""
+
+def hex_area(pitch):
+    """area of a hexagonal lattice element with flat to flat distance pitch"""
+    return np.sqrt(3) / 2 * pitch**2
+
+def pin_volumes(p):
+    """{pin name: {material: volume (cm3) of one pin}} of the pin universes of structure_esfr"""
+    inner_fuel, outer_fuel = fuels(p)
+    H = p['FA_height']
+    r_fuel, r_clad_in, r_clad_out = p['fuel_outer_d']/2, p['clad_inner_d']/2, p['clad_outer_d']/2
+
+    # the pins are bounded by the elements of the assembly lattice
+    element = hex_area(p['lattice_pitch']/17) * H
+    fuel = np.pi * r_fuel**2 * H
+    bond = np.pi * (r_clad_in**2 - r_fuel**2) * H
+    clad = np.pi * (r_clad_out**2 - r_clad_in**2) * H
+    solid = np.pi * r_clad_out**2 * H
+    coolant = element - solid
+
+    def fuel_pin(material):
+        return {material: fuel, matter.sodium: bond + coolant, matter.clad_mat: clad}
+
+    def solid_pin(material):
+        return {material: solid, matter.sodium: coolant}
+
+    rod = solid * p['crod_insertion_length'] / H
+    return {'inner fuel': fuel_pin(inner_fuel),
+            'outer fuel': fuel_pin(outer_fuel),
+            'radial reflector': solid_pin(matter.EM10),
+            'sodium': {matter.sodium: element},
+            'follower': solid_pin(matter.follower),
+            'control rod': {matter.boron_carbide: rod, matter.follower: solid - rod, matter.sodium: coolant}}
+
+def _add(volumes, material, volume, n=1):
+    volumes[material] = volumes.get(material, 0.) + n * volume
+
+def count_pins(core):
+    """{assembly name: {pin name: number of pins}} from the assembly lattices of a build_core dict"""
+    pin_names = {pin.id: name for name, pin in core['pins'].items()}
+    counts = {}
+    for name, FA_uni in core['assemblies'].items():
+        counts[name] = {}
+        for ring in assembly_lattice(FA_uni).universes:
+            for pin in ring:
+                counts[name][pin_names[pin.id]] = counts[name].get(pin_names[pin.id], 0) + 1
+    return counts
+
+def count_assemblies(core):
+    """{assembly name: number in core_lat}"""
+    names = {FA_uni.id: name for name, FA_uni in core['assemblies'].items()}
+    counts = dict.fromkeys(core['assemblies'], 0)
+    for ring in core['core_uni_grid']:
+        for FA_uni in ring:
+            counts[names[FA_uni.id]] += 1
+    return counts
+
+def material_volumes(params=None):
+    """{material: volume (cm3)} of all materials of the core for params"""
+    p = default_params if params is None else params
+    core = build_core(p)
+    per_pin = pin_volumes(p)
+    pins = count_pins(core)
+    assemblies = count_assemblies(core)
+    H = p['FA_height']
+
+    volumes = {}
+    assembly = hex_area(p['lattice_pitch']) * H
+    for name, n in assemblies.items():
+        for pin, n_pins in pins[name].items():
+            for material, volume in per_pin[pin].items():
+                _add(volumes, material, volume, n * n_pins)
+        # sodium of the assembly lattice outside its rings of pins
+        _add(volumes, matter.sodium, assembly - sum(n_pins for n_pins in pins[name].values()) * hex_area(p['lattice_pitch']/17) * H, n)
+
+    # sodium between the core lattice and the outer hexagonal prism, axial reflectors over the whole prism
+    core_area = 3 * np.sqrt(3) / 2 * p['core_r']**2
+    _add(volumes, matter.sodium, core_area * H - sum(assemblies.values()) * assembly)
+    _add(volumes, matter.EM10, core_area * (p['h_top_ar'] + p['h_bottom_ar']))
+    return volumes
+
+def check_volumes(params=None, samples=10000000, threads=None, directory='volume_check'):
+    """
+    Stochastic volumes of the burnable materials with openmc.VolumeCalculation (threads in
+    parallel), printed next to the analytical ones. Returns {material: (analytical, stochastic,
+    std)}.
+    """
+    import openmc
+    from main_esfr import build_model
+
+    p = default_params if params is None else params
+    model = build_model(p)
+    analytical = material_volumes(p)
+    burnable = [material for material in model.materials if material.volume is not None]
+
+    height = [-(p['FA_height']/2 + p['h_bottom_ar']), p['FA_height']/2 + p['h_top_ar']]
+    calculation = openmc.VolumeCalculation(burnable, samples, [-p['core_r'], -p['core_r'], height[0]],
+                                           [p['core_r'], p['core_r'], height[1]])
+    model.settings.volume_calculations = [calculation]
+
+    os.makedirs(directory, exist_ok=True)
+    model.export_to_xml(directory)
+    openmc.calculate_volumes(threads=threads, output=False, cwd=directory)
+    calculation.load_results(os.path.join(directory, 'volume_1.h5'))
+
+    result = {}
+    print('{:24s} {:>14s} {:>14s} {:>10s}'.format('material', 'analytical', 'stochastic', 'diff/std'))
+    for material in burnable:
+        stochastic = calculation.volumes[material.id]
+        result[material] = (analytical[material], stochastic.nominal_value, stochastic.std_dev)
+        print('{:24s} {:14.6g} {:14.6g} {:10.2f}'.format(material.name, analytical[material], stochastic.nominal_value,
+                                                        (stochastic.nominal_value - analytical[material]) / stochastic.std_dev))
+    return result
+
+
+if __name__ == '__main__':
+    for material, volume in material_volumes().items():
+        print('{:24s} {:14.6g} cm3'.format(material.name, volume))
+    check_volumes()
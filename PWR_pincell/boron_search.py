@@ -0,0 +1,131 @@
+import os
+import sys
+
+import numpy as np
+
+import openmc
+import openmc.lib
+from openmc.data import atomic_mass, AVOGADRO, NATURAL_ABUNDANCE
+
+from project import build_model
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from warm_start import warm_inactive, nearest
+from staged_search import regula_falsi
+
+"""
+Boron letdown search for the PWR pin cell.
+
+The critical boron concentration used to be found by trial ("0.00033 works"). Here the
+model is loaded once in memory with openmc.lib, and only the atom densities of the borated
+water are changed between successive eigenvalue runs. Early runs use few particles per
+batch and the particle count grows as the search gets close to the critical concentration.
+Every run after the first starts from the final source bank of the run with the nearest
+concentration, copied into the source bank in memory, with fewer inactive batches.
+"""
+
+# particles per batch, from the cheapest to the full precision run of project.py
+stages = [1000, 3000, 10000]
+batches = 100
+inactive = 10
+
+def water_densities(ppm, density=1.0):
+    """atom densities (atom/b-cm) of water with ppm (by weight) of natural boron"""
+    w_boron = ppm * 1e-6
+    m_h2o = 2*atomic_mass('H1') + atomic_mass('O16')
+    m_boron = sum(NATURAL_ABUNDANCE[nuc] * atomic_mass(nuc) for nuc in ('B10', 'B11'))
+
+    n_water = (1 - w_boron) * density * AVOGADRO / m_h2o * 1e-24
+    n_boron = w_boron * density * AVOGADRO / m_boron * 1e-24
+
+    return {'H1': 2*n_water,
+            'O16': n_water,
+            'B10': NATURAL_ABUNDANCE['B10'] * n_boron,
+            'B11': NATURAL_ABUNDANCE['B11'] * n_boron}
+
+def boron_search(bracket=(0., 1500.), target=1.0, tol=100e-5, stages=stages, max_iter=15,
+                 directory='boron_search', warm=True):
+    """
+    Find the boron concentration (ppm) giving keff = target.
+
+    Regula falsi iterations (Illinois variant, see common/staged_search.py) are done on the
+    concentration within bracket. The particle count moves to the next entry of stages once
+    keff is within max(tol, 2 std) of target, and the search has converged when a run with
+    the last entry is within max(tol, 2 std) of target. With warm, runs start from the source
+    bank of the nearest concentration run so far.
+
+    Returns a dict with the 'ppm', its 'keff' and 'std', the total number of 'histories'
+    spent and the 'history' of all runs.
+    """
+    # the model is built with boron so that B10 and B11 exist in the in-memory material
+    model = build_model(ppm=max(bracket), particles=stages[0], batches=batches, inactive=inactive)
+    water = next(mat for mat in model.materials if mat.name == 'h2o')
+
+    os.makedirs(directory, exist_ok=True)
+    model.export_to_xml(directory)
+
+    history = []
+    banks = {}
+    rng = np.random.default_rng(1)
+
+    def evaluate(ppm, stage):
+        densities = water_densities(ppm)
+        openmc.lib.materials[water.id].set_densities(list(densities), list(densities.values()))
+        openmc.lib.settings.particles = stages[stage]
+
+        # fewer inactive batches, same number of active batches when starting from a converged bank
+        source = nearest(banks, ppm) if warm else None
+        n_inactive = inactive if source is None else min(warm_inactive, inactive)
+        openmc.lib.settings.inactive = n_inactive
+        openmc.lib.settings.batches = n_inactive + batches - inactive
+
+        openmc.lib.hard_reset()
+        openmc.lib.simulation_init()
+        if source is not None:
+            bank = openmc.lib.source_bank()
+            if len(source) == len(bank):
+                bank[:] = source
+            else:
+                # resampled to the particle count of this stage
+                bank[:] = source[rng.integers(len(source), size=len(bank))]
+        for _ in openmc.lib.iter_batches():
+            pass
+        banks[ppm] = openmc.lib.source_bank().copy()
+        openmc.lib.simulation_finalize()
+        keff, std = openmc.lib.keff()
+
+        n_batches = n_inactive + batches - inactive
+        history.append({'ppm': ppm, 'keff': keff, 'std': std,
+                        'histories': stages[stage] * n_batches, 'stage': stage})
+        print('{:3d}   boron = {:7.1f} ppm   keff = {:.5f} +/- {:.5f}   ({} particles x {} batches)'.format(
+              len(history), ppm, keff, std, stages[stage], n_batches))
+        return keff - target, std
+
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        with openmc.lib.run_in_memory(output=False):
+            ppm, converged = regula_falsi(evaluate, bracket, len(stages), tol, max_iter)
+    finally:
+        os.chdir(cwd)
+
+    if not converged:
+        print('boron_search: no convergence after {} iterations'.format(max_iter))
+
+    last = history[-1]
+    return {'ppm': last['ppm'],
+            'keff': last['keff'],
+            'std': last['std'],
+            'histories': sum(run['histories'] for run in history),
+            'converged': converged,
+            'history': history}
+
+
+if __name__ == '__main__':
+    result = boron_search()
+
+    print()
+    print('critical boron concentration: {:.1f} ppm'.format(result['ppm']))
+    print('keff = {:.5f} +/- {:.5f}'.format(result['keff'], result['std']))
+    print('total histories: {} (= {:.1f} full precision runs)'.format(
+          result['histories'], result['histories'] / (stages[-1] * batches)))
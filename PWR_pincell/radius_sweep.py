@@ -0,0 +1,99 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from project import build_model
+from tally_processing import thermal_utilization
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from run_cache import cached_run
+from warm_start import write_source, warm_start, nearest
+
+"""
+Thermal utilization factor f as function of fuel pin radius.
+
+The pin cell is run for a coarse set of radii in a process pool (one working directory per
+radius in the run cache, so radii computed by an earlier sweep are not run again), f is read
+back from each statepoint, and new radii are only inserted in the intervals where f(r) is
+not yet resolved: where a point deviates from the straight line through its neighbours
+(curvature), or where the statistical uncertainty is too large to tell. Radii inserted by
+refinement start from the source bank of the nearest radius already run, with fewer inactive
+batches (see warm_start.py). Results are stored in f_sweep.txt and read by tally_processing.py.
+"""
+
+def run_point(radius, particles=10000, batches=100, inactive=10, threads=None, source=None,
+              directory='radius_sweep'):
+    """
+    run the pin cell with fuel radius (mm), starting from the source file source if given,
+    return (f, std of f, source file of the final source bank)
+    """
+    model = build_model(fuel_radius=radius/10, particles=particles, batches=batches, inactive=inactive)
+    warm_start(model.settings, source)
+    sp_path = cached_run(model, threads=threads, output=False)
+    return thermal_utilization(sp_path) + (write_source(sp_path, os.path.join(directory, 'sources')),)
+
+def refine(r, f, f_std, tol, min_dr):
+    """radii to insert: midpoints of the intervals around points where f is not resolved within tol"""
+    new = set()
+    for i in range(1, len(r) - 1):
+        # deviation from the straight line through the neighbours, and its uncertainty
+        w = (r[i] - r[i-1]) / (r[i+1] - r[i-1])
+        f_lin = (1 - w) * f[i-1] + w * f[i+1]
+        std = np.sqrt(f_std[i]**2 + ((1 - w) * f_std[i-1])**2 + (w * f_std[i+1])**2)
+
+        if abs(f[i] - f_lin) > tol or std > tol:
+            for a, b in ((r[i-1], r[i]), (r[i], r[i+1])):
+                if b - a >= 2*min_dr:
+                    new.add(round((a + b) / 2, 6))
+
+    return sorted(new)
+
+def sweep(r_min=3.9, r_max=9.3, n_start=7, tol=2e-3, min_dr=0.2, max_rounds=5,
+          workers=4, directory='radius_sweep', warm=True, **run_args):
+    """
+    Adaptive sweep of f over fuel radii r_min to r_max (mm).
+
+    Starts with n_start uniformly spaced radii and inserts midpoints where refine() asks for
+    them, never closer than min_dr, for at most max_rounds rounds. With warm, inserted radii
+    start from the source of the nearest radius run so far. run_args are passed to run_point.
+    Returns the sorted arrays (r, f, f_std), also saved in directory/f_sweep.txt.
+    """
+    results = {}
+    sources = {}
+    radii = list(np.round(np.linspace(r_min, r_max, n_start), 6))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i in range(max_rounds + 1):
+            futures = {radius: pool.submit(run_point, radius, source=nearest(sources, radius) if warm else None,
+                                           directory=directory, **run_args)
+                       for radius in radii}
+            for radius, future in futures.items():
+                f, f_std, sources[radius] = future.result()
+                results[radius] = (f, f_std)
+
+            r = np.array(sorted(results))
+            f, f_std = np.array([results[radius] for radius in r]).T
+            print('round {}: {} radii, {} runs in total'.format(i, len(radii), len(r)))
+
+            radii = [radius for radius in refine(r, f, f_std, tol, min_dr) if radius not in results]
+            if not radii:
+                break
+
+    save_sweep(r, f, f_std, directory)
+    return r, f, f_std
+
+def save_sweep(r, f, f_std, directory='radius_sweep'):
+    os.makedirs(directory, exist_ok=True)
+    np.savetxt(os.path.join(directory, 'f_sweep.txt'), np.column_stack([r, f, f_std]),
+               header='fuel radius (mm), thermal utilization f, std of f')
+
+def load_sweep(directory='radius_sweep'):
+    """(r, f, f_std) of a previous sweep"""
+    r, f, f_std = np.loadtxt(os.path.join(directory, 'f_sweep.txt'), unpack=True)
+    return r, f, f_std
+
+
+if __name__ == '__main__':
+    sweep(threads=max(1, os.cpu_count() // 4))
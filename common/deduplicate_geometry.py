@@ -0,0 +1,163 @@
+import copy
+import os
+import tempfile
+
+import numpy as np
+
+import openmc
+
+"""
+Merging of structurally identical surfaces, universes and lattices.
+
+Models built from functions often create the same thing several times under different
+names: in the ESFR every assembly lattice has its own outer universe with a single sodium
+cell, as has the core lattice, and after simplify_geometry.py the sodium pin is yet another
+universe with a single sodium cell. OpenMC keeps, exports and loads each of them.
+
+deduplicate() computes bottom-up a key of every object from what it does, not what it is
+called: surfaces by type, coefficients and boundary condition, cells by fill, region (in
+terms of the merged surfaces), translation, rotation and temperature, universes by the set of
+their cell keys and lattices by type, pitch, position (lower left corner or center),
+orientation, outer universe and the universes in every position. Objects with equal keys are replaced by the first of them.
+Names and ids are not part of the keys.
+
+A cell belongs to exactly one universe in geometry.xml, so cells are merged together with
+their universe. The geometry is copied (the materials are not), so cached universes stay
+untouched.
+"""
+
+def _halfspaces(region):
+    """all half-spaces of a region"""
+    if isinstance(region, openmc.Halfspace):
+        yield region
+    elif isinstance(region, openmc.Complement):
+        yield from _halfspaces(region.node)
+    elif region is not None:
+        for node in region:
+            yield from _halfspaces(node)
+
+def _surface_key(surface):
+    coefficients = tuple(sorted((name, round(value, 12)) for name, value in surface.coefficients.items()))
+    return (type(surface).__name__, coefficients, surface.boundary_type, getattr(surface, 'albedo', None))
+
+def _fill_key(fill):
+    if fill is None:
+        return None
+    if isinstance(fill, openmc.Material):
+        return ('material', fill.id)
+    if isinstance(fill, (openmc.Universe, openmc.Lattice)):
+        return (type(fill).__name__, fill.id)
+    # distributed materials
+    return ('materials', tuple(None if material is None else material.id for material in fill))
+
+def _array_key(value):
+    return None if value is None else tuple(np.round(np.ravel(value), 12))
+
+def _map_universes(universes, canonical):
+    """replace the universes of a (nested) lattice layout in place, returns their ids in layout order"""
+    ids = []
+    for i, item in enumerate(universes):
+        if isinstance(item, (list, tuple, np.ndarray)):
+            ids.append(_map_universes(item, canonical))
+        else:
+            universes[i] = canonical(item)
+            ids.append(universes[i].id)
+    return tuple(ids)
+
+def deduplicate(geometry):
+    """
+    copy of geometry with identical surfaces, universes and lattices merged, and the number
+    of merged objects {'surfaces': n, 'cells': n, 'universes': n, 'lattices': n}
+    """
+    before = count_objects(geometry)
+    materials = geometry.get_all_materials()
+    geometry = copy.deepcopy(geometry, {id(material): material for material in materials.values()})
+
+    surfaces = {}
+    for surface in geometry.get_all_surfaces().values():
+        surfaces.setdefault(_surface_key(surface), surface)
+
+    seen = {}     # key -> canonical object
+    done = {}     # id(object) -> canonical object
+
+    def cell_key(cell):
+        if isinstance(cell.fill, (openmc.Universe, openmc.Lattice)):
+            cell.fill = canonical(cell.fill)
+        for halfspace in _halfspaces(cell.region):
+            halfspace.surface = surfaces[_surface_key(halfspace.surface)]
+        return repr((_fill_key(cell.fill), str(cell.region) if cell.region is not None else None,
+                     _array_key(cell.translation), _array_key(cell.rotation), _array_key(cell.temperature)))
+
+    def canonical(obj):
+        if id(obj) in done:
+            return done[id(obj)]
+        if isinstance(obj, openmc.Lattice):
+            if obj.outer is not None:
+                obj.outer = canonical(obj.outer)
+            # a RectLattice is placed by its lower left corner, a HexLattice by its center
+            position = obj.lower_left if isinstance(obj, openmc.RectLattice) else obj.center
+            key = (type(obj).__name__, _array_key(obj.pitch), _array_key(position),
+                   getattr(obj, 'orientation', None), None if obj.outer is None else obj.outer.id,
+                   _map_universes(obj.universes, canonical))
+        elif isinstance(obj, openmc.Universe):
+            key = ('Universe', tuple(sorted(cell_key(cell) for cell in obj.cells.values())))
+        else:
+            # e.g. DAGMC universes are kept as they are
+            key = (type(obj).__name__, obj.id)
+        done[id(obj)] = seen.setdefault(key, obj)
+        return done[id(obj)]
+
+    geometry.root_universe = canonical(geometry.root_universe)
+    after = count_objects(geometry)
+    return geometry, {kind: before[kind] - after[kind] for kind in before}
+
+def count_objects(geometry):
+    """{'surfaces': n, 'cells': n, 'universes': n, 'lattices': n} of geometry"""
+    return {'surfaces': len(geometry.get_all_surfaces()),
+            'cells': len(geometry.get_all_cells()),
+            'universes': len(geometry.get_all_universes()),
+            'lattices': len(geometry.get_all_lattices())}
+
+def xml_size(geometry):
+    """size (bytes) of geometry.xml of geometry"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'geometry.xml')
+        geometry.export_to_xml(path)
+        return os.path.getsize(path)
+
+def report(geometry):
+    """print the objects and geometry.xml size of geometry and of its deduplicated copy"""
+    merged, _ = deduplicate(geometry)
+    rows = [('original', geometry), ('deduplicated', merged)]
+    print('{:14s} {:>9s} {:>9s} {:>9s} {:>9s} {:>12s}'.format('geometry', 'surfaces', 'cells', 'universes', 'lattices', 'xml bytes'))
+    for name, g in rows:
+        counts = count_objects(g)
+        print('{:14s} {:9d} {:9d} {:9d} {:9d} {:12d}'.format(name, counts['surfaces'], counts['cells'],
+                                                          counts['universes'], counts['lattices'], xml_size(g)))
+    return merged
+
+
+if __name__ == '__main__':
+    # two RectLattices of the same pins side by side: the pins are merged, the lattices are not
+    fuel = openmc.Material(name='fuel')
+    fuel.add_nuclide('U235', 1.)
+    fuel.set_density('g/cm3', 10.)
+
+    def pin():
+        cylinder = openmc.ZCylinder(r=0.4)
+        return openmc.Universe(cells=[openmc.Cell(fill=fuel, region=-cylinder), openmc.Cell(region=+cylinder)])
+
+    def lattice(x0):
+        lattice = openmc.RectLattice()
+        lattice.lower_left = (x0, -1.)
+        lattice.pitch = (1., 1.)
+        lattice.universes = [[pin(), pin()], [pin(), pin()]]
+        return lattice
+
+    box = openmc.model.rectangular_prism(4., 2., boundary_type='vacuum')
+    middle = openmc.XPlane(0.)
+    root = openmc.Universe(cells=[openmc.Cell(fill=lattice(-2.), region=box & -middle),
+                                  openmc.Cell(fill=lattice(0.), region=box & +middle)])
+    geometry, merged = deduplicate(openmc.Geometry(root))
+    assert merged['lattices'] == 0 and merged['universes'] == 7, merged
+    print('RectLattice geometry: merged', merged)
@@ -0,0 +1,333 @@
+import contextlib
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import xml.etree.ElementTree as ET
+
+import openmc
+
+import tally_budget
+
+"""
+Content-hashed cache of OpenMC runs.
+
+A model is identified by a hash of its materials, geometry, settings and tallies XML, after
+the ids of all objects have been renumbered in the order they are reached from the root
+universe. Two identical models therefore get the same hash even when they were built in a
+different order or with different auto-ids, and cached_run() returns the stored statepoint
+instead of running OpenMC again.
+
+Files the XML only refers to by path, a multi-group cross section library or a source file,
+are hashed by their content, so e.g. a library regenerated at the same path is a new model.
+
+Since the ids are renumbered, tallies in a cached statepoint should be looked up by name or
+score, not by id.
+
+Several processes can share a cache (e.g. the workers of radius_sweep.py). A run is done in
+a tmp-* directory, which only becomes an entry, with its meta.json, by a rename under the
+lock file of the cache; lookups, eviction and copies of the statepoints hold the same lock,
+so no process removes an entry another one is reading or finishing.
+"""
+
+cache_dir = os.environ.get('OPENMC_RUN_CACHE', os.path.expanduser('~/.cache/openmc-runs'))
+max_bytes = 20e9     # total size of the cache before the least recently used runs are evicted
+max_entries = 200    # number of cached runs before the least recently used runs are evicted
+
+_lattice_tags = ('lattice', 'hex_lattice')
+_cell_filters = ('cell', 'cellfrom', 'cellborn', 'distribcell')
+
+
+##################################################
+################### HASHING ######################
+##################################################
+
+def _new_id(ids, old):
+    """give old the next canonical id, return True if it did not have one"""
+    if old in ids:
+        return False
+    ids[old] = str(len(ids) + 1)
+    return True
+
+def _map_tokens(text, ids):
+    """replace every integer in text by its canonical id"""
+    return re.sub(r'\d+', lambda match: ids.get(match.group(), match.group()), text or '')
+
+def _lattice_children(lattice):
+    outer = lattice.find('outer')
+    children = [] if outer is None else [outer.text.strip()]
+    return children + lattice.find('universes').text.split()
+
+def _geometry_ids(geometry, materials):
+    """canonical ids of universes (and lattices), cells, surfaces and materials, in the order they are reached from the root"""
+    cells = {}
+    for cell in geometry.iter('cell'):
+        cells.setdefault(cell.get('universe', '0'), []).append(cell)
+    lattices = {lattice.get('id'): lattice for lattice in geometry if lattice.tag in _lattice_tags}
+
+    ids = {'universe': {}, 'cell': {}, 'surface': {}, 'material': {}}
+
+    def visit(universe):
+        if not _new_id(ids['universe'], universe):
+            return
+        if universe in lattices:
+            for child in _lattice_children(lattices[universe]):
+                visit(child)
+            return
+        for cell in cells.get(universe, []):
+            _new_id(ids['cell'], cell.get('id'))
+            for surface in re.findall(r'\d+', cell.get('region', '')):
+                _new_id(ids['surface'], surface)
+            for material in cell.get('material', '').split():
+                if material != 'void':
+                    _new_id(ids['material'], material)
+            if cell.get('fill') is not None:
+                visit(cell.get('fill'))
+
+    filled = {cell.get('fill') for cell in geometry.iter('cell')}
+    for lattice in lattices.values():
+        filled.update(_lattice_children(lattice))
+    for universe in cells:
+        if universe not in filled:
+            visit(universe)
+
+    # anything not reachable from the root keeps the order of the files
+    for surface in geometry.iter('surface'):
+        _new_id(ids['surface'], surface.get('id'))
+    for material in materials.iter('material'):
+        _new_id(ids['material'], material.get('id'))
+
+    return ids
+
+def _canonical_geometry(geometry, ids):
+    for element in geometry:
+        if element.tag == 'surface':
+            element.set('id', ids['surface'][element.get('id')])
+        elif element.tag == 'cell':
+            element.set('id', ids['cell'][element.get('id')])
+            element.set('universe', ids['universe'][element.get('universe', '0')])
+            for attr, kind in (('fill', 'universe'), ('material', 'material'), ('region', 'surface')):
+                if element.get(attr) is not None:
+                    element.set(attr, _map_tokens(element.get(attr), ids[kind]))
+        elif element.tag in _lattice_tags:
+            element.set('id', ids['universe'][element.get('id')])
+            for child in ('outer', 'universes'):
+                if element.find(child) is not None:
+                    element.find(child).text = _map_tokens(element.find(child).text, ids['universe'])
+
+def _canonical_tallies(settings, tallies, ids):
+    meshes, filters, tally_ids = {}, {}, {}
+    for root in (settings, tallies):
+        for mesh in root.iter('mesh'):
+            _new_id(meshes, mesh.get('id'))
+            mesh.set('id', meshes[mesh.get('id')])
+    for tag in ('entropy_mesh', 'ufs_mesh'):
+        for element in settings.iter(tag):
+            element.text = _map_tokens(element.text, meshes)
+
+    for element in tallies.iter('filter'):
+        _new_id(filters, element.get('id'))
+        element.set('id', filters[element.get('id')])
+
+        kind = element.get('type')
+        bins = element.find('bins')
+        if kind in _cell_filters:
+            bins.text = _map_tokens(bins.text, ids['cell'])
+        elif kind in ('material', 'universe'):
+            bins.text = _map_tokens(bins.text, ids[kind])
+        elif kind in ('mesh', 'meshsurface'):
+            bins.text = _map_tokens(bins.text, meshes)
+
+    for element in tallies.iter('tally'):
+        _new_id(tally_ids, element.get('id'))
+        element.set('id', tally_ids[element.get('id')])
+        if element.find('filters') is not None:
+            element.find('filters').text = _map_tokens(element.find('filters').text, filters)
+
+def _canonical_text(element):
+    """element as text with sorted attributes and normalized whitespace"""
+    attrs = ' '.join('{}="{}"'.format(key, ' '.join(value.split())) for key, value in sorted(element.attrib.items()))
+    text = ' '.join((element.text or '').split())
+    return '<{} {}>{}{}</{}>'.format(element.tag, attrs, text,
+                                     ''.join(_canonical_text(child) for child in element), element.tag)
+
+def _sort_by_id(root):
+    root[:] = sorted(root, key=lambda element: (element.tag, int(element.get('id', 0))))
+
+def _file_digest(path):
+    """sha256 of the content of a file"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def _referenced_files(directory, materials, settings):
+    """
+    local files whose content the run depends on beyond their name: a multi-group library
+    set as materials.cross_sections (a continuous energy cross_sections.xml is identified by
+    its path, like OPENMC_CROSS_SECTIONS) and the source files of the settings
+    """
+    paths = []
+    for element in materials.iter('cross_sections'):
+        if element.text and not element.text.strip().endswith('.xml'):
+            paths.append(element.text.strip())
+    for source in settings.iter('source'):
+        if source.get('file') is not None:
+            paths.append(source.get('file'))
+        for element in source.iter('file'):
+            paths.append(element.text.strip())
+    paths = [os.path.join(directory, path) for path in paths]
+    return [path for path in paths if os.path.isfile(path)]
+
+def hash_xml(directory):
+    """canonical hash of the model XML files in directory and the content of the files they reference"""
+    def read(name):
+        path = os.path.join(directory, name)
+        return ET.parse(path).getroot() if os.path.exists(path) else ET.Element(name[:-4])
+
+    materials, geometry = read('materials.xml'), read('geometry.xml')
+    settings, tallies = read('settings.xml'), read('tallies.xml')
+
+    ids = _geometry_ids(geometry, materials)
+    _canonical_geometry(geometry, ids)
+    for material in materials.iter('material'):
+        material.set('id', ids['material'][material.get('id')])
+    _canonical_tallies(settings, tallies, ids)
+
+    sha = hashlib.sha256()
+    sha.update(openmc.__version__.encode())
+    sha.update(os.environ.get('OPENMC_CROSS_SECTIONS', '').encode())
+    for path in _referenced_files(directory, materials, settings):
+        sha.update(_file_digest(path).encode())
+    for root in (materials, geometry, settings, tallies):
+        _sort_by_id(root)
+        sha.update(_canonical_text(root).encode())
+    return sha.hexdigest()
+
+def model_hash(model, directory='.'):
+    """export model to directory and return its canonical hash"""
+    model.export_to_xml(directory)
+    return hash_xml(directory)
+
+
+##################################################
+################### CACHE ########################
+##################################################
+
+@contextlib.contextmanager
+def _locked(cache_dir):
+    """exclusive lock of cache_dir between processes"""
+    with open(os.path.join(cache_dir, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _read_meta(entry):
+    """meta.json of an entry, None if the entry is gone or not finished"""
+    try:
+        with open(os.path.join(entry, 'meta.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _write_meta(entry, meta):
+    with open(os.path.join(entry, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+
+def _entries(cache_dir):
+    """(entry, meta) of the finished runs, not of the tmp-* directories of runs in progress"""
+    entries = []
+    for entry in glob.glob(os.path.join(cache_dir, '*', 'meta.json')):
+        entry = os.path.dirname(entry)
+        meta = _read_meta(entry)
+        if not os.path.basename(entry).startswith('tmp-') and meta is not None:
+            entries.append((entry, meta))
+    return entries
+
+def statepoint(entry):
+    """last statepoint of a cached run"""
+    return sorted(glob.glob(os.path.join(entry, 'statepoint.*.h5')),
+                  key=lambda path: int(path.split('.')[-2]))[-1]
+
+def _copy(statepoint, copy_to):
+    if copy_to is not None:
+        for path in (statepoint, os.path.join(os.path.dirname(statepoint), 'summary.h5')):
+            if os.path.exists(path):
+                shutil.copy(path, copy_to)
+    return statepoint
+
+def evict(cache_dir=cache_dir, max_bytes=max_bytes, max_entries=max_entries, keep=None):
+    """remove the least recently used runs, except keep, until the cache is within max_bytes and max_entries"""
+    with _locked(cache_dir):
+        _evict(cache_dir, max_bytes, max_entries, keep)
+
+def _evict(cache_dir, max_bytes, max_entries, keep):
+    entries = sorted(_entries(cache_dir), key=lambda entry: (entry[0] == keep, entry[1]['last_used']))
+    total = sum(meta['size'] for entry, meta in entries)
+
+    while entries and (total > max_bytes or len(entries) > max_entries):
+        entry, meta = entries.pop(0)
+        if entry == keep:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= meta['size']
+        print('run cache: evicted {} ({:.1f} MB)'.format(os.path.basename(entry)[:12], meta['size'] / 1e6))
+
+def cached_run(model, cache_dir=cache_dir, max_bytes=max_bytes, max_entries=max_entries, copy_to=None, **run_args):
+    """
+    Run model with openmc.run(**run_args) unless an identical model has already been run.
+
+    Returns the path of the last statepoint of the run in the cache, with the summary.h5 of
+    the run next to it. If copy_to is given, the statepoint and summary are also copied
+    there, as if the model had been run in that directory.
+
+    A new run is only started if its tallies are within the limits of tally_budget.py.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    workdir = os.path.join(cache_dir, 'tmp-{}-{}'.format(os.getpid(), time.time_ns()))
+    os.makedirs(workdir)
+
+    key = model_hash(model, workdir)
+    entry = os.path.join(cache_dir, key)
+
+    with _locked(cache_dir):
+        meta = _read_meta(entry)
+        if meta is not None:
+            shutil.rmtree(workdir)
+            meta['last_used'] = time.time()
+            _write_meta(entry, meta)
+            print('run cache: {} already computed, skipping the run'.format(key[:12]))
+            return _copy(statepoint(entry), copy_to)
+
+    try:
+        tally_budget.check(model, mpi=bool(run_args.get('mpi_args')))
+        openmc.run(cwd=workdir, **run_args)
+    except BaseException:
+        shutil.rmtree(workdir)
+        raise
+
+    size = sum(os.path.getsize(os.path.join(workdir, name)) for name in os.listdir(workdir))
+    with _locked(cache_dir):
+        if os.path.exists(entry) and _read_meta(entry) is None:
+            # left by a process that died between the rename and writing meta.json
+            shutil.rmtree(entry)
+        try:
+            os.rename(workdir, entry)
+        except OSError:
+            if _read_meta(entry) is None:
+                shutil.rmtree(workdir, ignore_errors=True)
+                raise
+            # the same model was finished by another process in the meantime
+            shutil.rmtree(workdir)
+        else:
+            _write_meta(entry, {'hash': key, 'created': time.time(), 'last_used': time.time(), 'size': size})
+
+        _evict(cache_dir, max_bytes, max_entries, keep=entry)
+        return _copy(statepoint(entry), copy_to)
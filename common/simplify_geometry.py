@@ -0,0 +1,188 @@
+import copy
+
+import numpy as np
+
+import openmc
+
+"""
+Removal of half-spaces that are implied by the enclosing cells and lattices.
+
+Universes used in a lattice are often built as if they stood alone: every pin cell of the
+ESFR repeats the axial bounds of the assembly (-FA_top & +FA_bottom), and the coolant cells
+test the six planes of a hexagonal prism that contains the whole lattice element anyway.
+OpenMC tests all of them on every cell search and computes the distance to all of them on
+every step.
+
+simplify() walks the geometry from the root and collects for every universe the bounds it is
+always used in: the z interval of the enclosing cells (unchanged by 2D lattices) and the
+element of the lattice it fills. A half-space of a cell is dropped when it holds everywhere
+in those bounds in every place the universe is used: z planes outside the z interval, and
+convex xy regions (plane half-spaces, the inside of z cylinders and intersections of them)
+that contain the lattice element. Inside the enclosing bounds every cell covers exactly the
+same points as before.
+
+The geometry is copied (the materials are not), so cached universes stay untouched.
+"""
+
+_xy_surfaces = (openmc.ZCylinder, openmc.XPlane, openmc.YPlane)
+
+def _nodes(region):
+    if region is None:
+        return []
+    return list(region) if isinstance(region, openmc.Intersection) else [region]
+
+def _z_bounds(region, bounds=(-np.inf, np.inf)):
+    """z interval of bounds further limited by the z plane half-spaces of region"""
+    z_min, z_max = bounds
+    for node in _nodes(region):
+        if isinstance(node, openmc.Halfspace) and isinstance(node.surface, openmc.ZPlane):
+            if node.side == '-':
+                z_max = min(z_max, node.surface.z0)
+            else:
+                z_min = max(z_min, node.surface.z0)
+    return z_min, z_max
+
+def _element(lattice):
+    """vertices (x, y) of a lattice element around its center, slightly enlarged"""
+    if isinstance(lattice, openmc.HexLattice):
+        # the vertices point along x for orientation 'y' and along y for orientation 'x'
+        r = lattice.pitch[0] / np.sqrt(3)
+        angles = np.radians(np.arange(6) * 60. + (0. if lattice.orientation == 'y' else 30.))
+        return (1 + 1e-9) * r * np.column_stack([np.cos(angles), np.sin(angles)])
+    dx, dy = np.array(lattice.pitch[:2]) / 2 * (1 + 1e-9)
+    return np.array([[-dx, -dy], [dx, -dy], [dx, dy], [-dx, dy]])
+
+def _is_2d(lattice):
+    if isinstance(lattice, openmc.HexLattice):
+        return lattice.num_axial is None
+    return len(lattice.pitch) == 2
+
+def _convex_xy(node):
+    """True if node is a convex region that only depends on x and y"""
+    if isinstance(node, openmc.Halfspace):
+        surface = node.surface
+        if isinstance(surface, openmc.ZCylinder):
+            return node.side == '-'
+        if isinstance(surface, openmc.Plane):
+            return surface.c == 0
+        return isinstance(surface, _xy_surfaces)
+    if isinstance(node, openmc.Intersection):
+        return all(_convex_xy(n) for n in node)
+    return False
+
+def _implied(node, z_bounds, element):
+    z_min, z_max = z_bounds
+    if isinstance(node, openmc.Halfspace) and isinstance(node.surface, openmc.ZPlane):
+        return node.surface.z0 >= z_max if node.side == '-' else node.surface.z0 <= z_min
+    if element is not None and _convex_xy(node):
+        return all((x, y, 0.) in node for x, y in element)
+    return False
+
+def _contexts(geometry):
+    """{universe id: (universe, z bounds, element or None)} merged over all places it is used"""
+    contexts = {}
+    seen = set()
+
+    def merge(universe, z_bounds, element):
+        if universe.id in contexts:
+            _, (z_min, z_max), old = contexts[universe.id]
+            z_bounds = (min(z_min, z_bounds[0]), max(z_max, z_bounds[1]))
+            if old is None or element is None or old.shape != element.shape or not np.allclose(old, element):
+                element = None
+        contexts[universe.id] = (universe, z_bounds, element)
+
+    def visit(universe, z_bounds, element):
+        key = (universe.id, z_bounds, None if element is None else element.tobytes())
+        if key in seen:
+            return
+        seen.add(key)
+        merge(universe, z_bounds, element)
+
+        for cell in universe.cells.values():
+            if not isinstance(cell.fill, (openmc.Universe, openmc.Lattice)):
+                continue
+            moved = cell.translation is not None or cell.rotation is not None
+            bounds = (-np.inf, np.inf) if moved else _z_bounds(cell.region, z_bounds)
+            if isinstance(cell.fill, openmc.Universe):
+                visit(cell.fill, bounds, None)
+                continue
+
+            lattice = cell.fill
+            lattice_bounds = bounds if _is_2d(lattice) else (-np.inf, np.inf)
+            lattice_element = _element(lattice)
+            for child in lattice.get_unique_universes().values():
+                visit(child, lattice_bounds, lattice_element)
+            if lattice.outer is not None:
+                visit(lattice.outer, lattice_bounds, lattice_element)
+
+    visit(geometry.root_universe, (-np.inf, np.inf), None)
+    return contexts
+
+def simplify(geometry):
+    """copy of geometry without implied half-spaces, and the number of half-spaces removed"""
+    materials = geometry.get_all_materials()
+    geometry = copy.deepcopy(geometry, {id(material): material for material in materials.values()})
+
+    removed = 0
+    for universe, z_bounds, element in _contexts(geometry).values():
+        for cell in universe.cells.values():
+            nodes = _nodes(cell.region)
+            keep = [node for node in nodes if not _implied(node, z_bounds, element)]
+            if len(keep) == len(nodes):
+                continue
+            removed += len(nodes) - len(keep)
+            if not keep:
+                cell.region = None
+            elif len(keep) == 1:
+                cell.region = keep[0]
+            else:
+                cell.region = openmc.Intersection(keep)
+    return geometry, removed
+
+def count_surfaces(geometry):
+    """
+    surface tests of the geometry: the number of surfaces of every cell, summed over all cells
+    and averaged over the material cells (the cells where particles collide)
+    """
+    total, material_cells = 0, []
+    for cell in geometry.get_all_cells().values():
+        n = len(cell.region.get_surfaces()) if cell.region is not None else 0
+        total += n
+        if isinstance(cell.fill, openmc.Material):
+            material_cells.append(n)
+    return total, np.mean(material_cells) if material_cells else 0.
+
+def _rate(statepoint):
+    """active particles per second of a statepoint"""
+    import h5py
+
+    with h5py.File(statepoint, 'r') as f:
+        particles = f['n_particles'][()]
+        active = f['n_batches'][()] - f['n_inactive'][()]
+        seconds = f['runtime/active batches'][()]
+        keff = f['k_combined'][()]
+    return particles * active / seconds, keff
+
+def measure(model, directory='simplify_geometry', **run_args):
+    """
+    Run model as it is and simplified (same seed) and print the surfaces per material cell,
+    particles per second and keff of both. Returns the two rates.
+    """
+    import os
+
+    simplified, removed = simplify(model.geometry)
+    original = model.geometry
+
+    rates = []
+    print('{:12s} {:>10s} {:>16s} {:>14s} {:>20s}'.format('geometry', 'surfaces', 'per mat. cell', 'particles/s', 'keff'))
+    for name, geometry in (('original', original), ('simplified', simplified)):
+        model.geometry = geometry
+        sp_path = model.run(cwd=os.path.join(directory, name), output=False, **run_args)
+        rate, (k, k_std) = _rate(sp_path)
+        total, per_cell = count_surfaces(geometry)
+        print('{:12s} {:10d} {:16.2f} {:14.0f} {:12.5f}+/-{:.5f}'.format(name, total, per_cell, rate, k, k_std))
+        rates.append(rate)
+    model.geometry = original
+
+    print('{} half-spaces removed, {:.2f}x particles/s'.format(removed, rates[1] / rates[0]))
+    return rates
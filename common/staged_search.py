@@ -0,0 +1,54 @@
+"""
+Criticality search by regula falsi with staged statistics.
+
+Searches like the control rod search of the ESFR and the boron search of the PWR pin cell
+look for the x with keff(x) = target, where every keff is a Monte Carlo estimate. Early
+iterations only need to tell on which side of the root a point is, so they use cheap
+statistics; regula_falsi() moves to the next, more precise stage once a point is within
+max(tol, 2 std) of the root, i.e. when the current statistics can no longer tell, and repeats
+that point with the better statistics. The search has converged when a point of the last
+stage is within max(tol, 2 std) of the root.
+
+The Illinois variant halves the function value of an end point of the bracket that is kept
+twice in a row, so the bracket shrinks from both sides.
+"""
+
+def regula_falsi(evaluate, bracket, n_stages, tol=100e-5, max_iter=15):
+    """
+    Root of evaluate(x, stage) -> (keff - target, std) within bracket, with stage going from 0
+    to n_stages - 1. Returns the last x evaluated and whether the search converged; the
+    caller keeps the history of its runs.
+    """
+    stage = 0
+    lo, hi = bracket
+    f_lo, _ = evaluate(lo, stage)
+    f_hi, _ = evaluate(hi, stage)
+    if f_lo * f_hi > 0:
+        raise ValueError('keff - target has the same sign at both ends of the bracket {}'.format(bracket))
+
+    side = 0
+    x = hi
+    for i in range(max_iter):
+        x = hi - f_hi * (hi - lo) / (f_hi - f_lo)
+        f, std = evaluate(x, stage)
+
+        if abs(f) <= max(tol, 2*std):
+            if stage == n_stages - 1:
+                return x, True
+            # close to the root: repeat the same point with better statistics
+            stage += 1
+            continue
+
+        # keep the root bracketed, halving the stale end point if it is kept twice (Illinois)
+        if f * f_lo > 0:
+            lo, f_lo = x, f
+            if side == -1:
+                f_hi /= 2
+            side = -1
+        else:
+            hi, f_hi = x, f
+            if side == +1:
+                f_lo /= 2
+            side = +1
+
+    return x, False
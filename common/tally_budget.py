@@ -0,0 +1,137 @@
+import warnings
+
+import numpy as np
+
+import openmc
+
+"""
+Memory and statepoint size of the tallies of a model, estimated before the run.
+
+Every tally holds a result array of filter bins x (nuclides x scores) x 3 doubles (value,
+sum and sum of squares). In OpenMC this array is shared by the threads of a process (they
+add to it atomically), so the accumulator memory is per process, i.e. per MPI rank, and
+reducing the tallies over MPI adds one more double per bin and score. The per-thread
+buffers (the filter matches of the particle being tracked) do not grow with the bins.
+
+A statepoint stores the sum and sum of squares of every bin and score of the writable
+tallies, the bins of their filters and, unless written separately or only at some of the
+sourcepoint batches, the source bank; every statepoint batch writes one.
+tallies.out (settings.output['tallies'], on by default) is a text line per bin and score.
+
+check() walks model.tallies and warns above the *_warn sizes and refuses to run (ValueError)
+above the *_limit sizes; the limits are module attributes or arguments.
+"""
+
+memory_warn = 2e9          # accumulator bytes per process
+memory_limit = 16e9
+statepoint_warn = 5e9      # bytes of all statepoints of the run
+statepoint_limit = 50e9
+
+source_site_bytes = 84     # position, direction, energy, time, weight, delayed group, surface, particle
+text_line_bytes = 40       # a line of tallies.out
+
+def _instances(universe, cell_id, memo):
+    """number of instances of cell_id in universe"""
+    if universe.id not in memo:
+        n = 0
+        for cell in universe.cells.values():
+            if cell.id == cell_id:
+                n += 1
+            elif isinstance(cell.fill, openmc.Universe):
+                n += _instances(cell.fill, cell_id, memo)
+            elif isinstance(cell.fill, openmc.Lattice):
+                n += sum(_instances(child, cell_id, memo) for child in _flatten(cell.fill.universes))
+        memo[universe.id] = n
+    return memo[universe.id]
+
+def _flatten(universes):
+    for item in universes:
+        if isinstance(item, (list, tuple, np.ndarray)):
+            yield from _flatten(item)
+        else:
+            yield item
+
+def filter_bins(f, geometry=None):
+    """number of bins of a filter, geometry is needed for a DistribcellFilter"""
+    if isinstance(f, openmc.MeshSurfaceFilter):
+        dimension = f.mesh.dimension
+        return int(np.prod(dimension)) * 4 * len(dimension)
+    if isinstance(f, openmc.MeshFilter):
+        return int(np.prod(f.mesh.dimension))
+    if isinstance(f, openmc.DistribcellFilter):
+        if geometry is None:
+            raise ValueError('the bins of a DistribcellFilter depend on the geometry')
+        cell_id = f.bins[0] if not isinstance(f.bins[0], openmc.Cell) else f.bins[0].id
+        return _instances(geometry.root_universe, cell_id, {})
+    return f.num_bins
+
+def estimate(model, mpi=False):
+    """
+    list of {'name', 'bins', 'memory', 'statepoint'} of every tally of model (bins = filter
+    bins x nuclides x scores, bytes per process and per statepoint, none if not writable),
+    and a dict of the totals with the 'source' bytes per statepoint, the number of
+    'statepoints', the bytes of all statepoints as 'statepoint total' and of 'tallies.out'
+    """
+    rows = []
+    for tally in model.tallies:
+        n_filter_bins = int(np.prod([filter_bins(f, model.geometry) for f in tally.filters]))
+        n_columns = max(1, len(tally.nuclides)) * len(tally.scores)
+        bins = n_filter_bins * n_columns
+        filter_bytes = sum(8 * len(np.ravel(f.bins)) for f in tally.filters
+                           if not isinstance(f, (openmc.MeshFilter, openmc.DistribcellFilter)))
+        rows.append({'name': tally.name, 'bins': bins, 'filter bins': n_filter_bins,
+                     'memory': bins * 8 * (4 if mpi else 3),
+                     'statepoint': bins * 16 + filter_bytes if tally.writable else 0})
+
+    settings = model.settings
+    sourcepoint = settings.sourcepoint or {}
+    source_in_statepoint = sourcepoint.get('write', True) and not sourcepoint.get('separate', False)
+    statepoints = len((settings.statepoint or {}).get('batches', [])) or 1
+    source_statepoints = min(statepoints, len(sourcepoint.get('batches', [])) or statepoints)
+    source = source_site_bytes * (settings.particles or 0) if source_in_statepoint else 0
+    per_statepoint = sum(row['statepoint'] for row in rows) + source
+
+    output = settings.output or {}
+    text = sum(row['bins'] + row['filter bins'] for row in rows) * text_line_bytes if output.get('tallies', True) else 0
+    totals = {'bins': sum(row['bins'] for row in rows),
+              'memory': sum(row['memory'] for row in rows),
+              'source': source,
+              'statepoints': statepoints,
+              'statepoint': per_statepoint,
+              'statepoint total': (per_statepoint - source) * statepoints + source * source_statepoints,
+              'tallies.out': text}
+    return rows, totals
+
+def print_estimate(rows, totals):
+    print('{:40s} {:>14s} {:>12s} {:>12s}'.format('tally', 'bins', 'memory', 'statepoint'))
+    for row in rows:
+        print('{:40s} {:14d} {:10.1f}MB {:10.1f}MB'.format(row['name'][:40], row['bins'], row['memory'] / 1e6,
+                                                           row['statepoint'] / 1e6))
+    print('{:40s} {:14d} {:10.1f}MB {:10.1f}MB'.format('total (per process, per statepoint)', totals['bins'],
+                                                       totals['memory'] / 1e6, totals['statepoint'] / 1e6))
+    print('source bank {:.1f} MB per statepoint, {} statepoint(s), {:.1f} MB in all, tallies.out {:.1f} MB'.format(
+          totals['source'] / 1e6, totals['statepoints'], totals['statepoint total'] / 1e6, totals['tallies.out'] / 1e6))
+
+def check(model, mpi=False, memory_warn=None, memory_limit=None, statepoint_warn=None, statepoint_limit=None):
+    """
+    estimate of model, warns above the *_warn sizes, ValueError above the *_limit sizes (the
+    module attributes at the time of the call for those not given)
+    """
+    memory_warn = globals()['memory_warn'] if memory_warn is None else memory_warn
+    memory_limit = globals()['memory_limit'] if memory_limit is None else memory_limit
+    statepoint_warn = globals()['statepoint_warn'] if statepoint_warn is None else statepoint_warn
+    statepoint_limit = globals()['statepoint_limit'] if statepoint_limit is None else statepoint_limit
+
+    rows, totals = estimate(model, mpi)
+    largest = sorted(rows, key=lambda row: row['bins'], reverse=True)[:3]
+    culprits = ', '.join('{!r} {} bins'.format(row['name'], row['bins']) for row in largest)
+
+    for what, size, warn, limit in (('tally memory per process', totals['memory'], memory_warn, memory_limit),
+                                    ('statepoint output', totals['statepoint total'] + totals['tallies.out'],
+                                     statepoint_warn, statepoint_limit)):
+        if size > limit:
+            raise ValueError('{} of {:.2f} GB is above the limit of {:.2f} GB (largest tallies: {})'.format(
+                             what, size / 1e9, limit / 1e9, culprits))
+        if size > warn:
+            warnings.warn('{} of {:.2f} GB (largest tallies: {})'.format(what, size / 1e9, culprits))
+    return rows, totals
@@ -0,0 +1,57 @@
+import hashlib
+import os
+
+import numpy as np
+import h5py
+
+import openmc
+
+"""
+Warm starts from the fission source of a previous run.
+
+Cases of a sweep or search differ by one parameter, so the converged fission source of one
+case is a much better initial source for the next than the uniform box, and most of the
+inactive batches can be skipped. write_source() stores the source bank of a statepoint as a
+source file and warm_start() starts the settings of the next case from it.
+
+Source files are named by a hash of their content, so the model XML (and the run cache key,
+see run_cache.py) of a warm started run changes with the source it starts from.
+"""
+
+warm_inactive = 3    # inactive batches of a run started from a converged source
+
+def write_source(statepoint, directory):
+    """source file in directory with the source bank of statepoint, None if it has none"""
+    with h5py.File(statepoint, 'r') as sp:
+        if 'source_bank' not in sp:
+            return None
+        bank = sp['source_bank'][()]
+
+    digest = hashlib.sha256(bank.tobytes()).hexdigest()[:16]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.abspath(os.path.join(directory, 'source_{}.h5'.format(digest)))
+    if not os.path.exists(path):
+        with h5py.File(path, 'w') as f:
+            f.attrs['filetype'] = np.bytes_(b'source')
+            f.create_dataset('source_bank', data=bank)
+    return path
+
+def warm_start(settings, source, inactive=warm_inactive):
+    """
+    Start settings from the source file, with at most inactive inactive batches and the same
+    number of active batches. Nothing is changed if source is None.
+    """
+    if source is None:
+        return settings
+
+    n_active = settings.batches - settings.inactive
+    settings.source = openmc.Source(filename=source)
+    settings.inactive = min(inactive, settings.inactive)
+    settings.batches = settings.inactive + n_active
+    return settings
+
+def nearest(sources, x):
+    """source of the case closest to x in sources = {x: source}, None if there is none"""
+    if not sources:
+        return None
+    return sources[min(sources, key=lambda key: abs(key - x))]